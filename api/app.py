@@ -21,8 +21,9 @@ from flask_limiter.util import get_remote_address
 from werkzeug.exceptions import HTTPException
 
 from api.export import ExportService
+from api.json_provider import setup_json_provider
 from api.logging_config import setup_logging
-from api.ops_daily_import import register_ops_daily_import
+from api.ops_daily_import import MAX_UPLOAD_TOTAL_BYTES, register_ops_daily_import
 from api.request_middleware import setup_request_logging
 from api.schemas import (
     CatalogSearchParams,
@@ -249,12 +250,16 @@ else:
 
 setup_logging(app)
 setup_request_logging(app)
+setup_json_provider(app)
 
 app.config.update(
     RATELIMIT_HEADERS_ENABLED=True,
     RATELIMIT_HEADER_LIMIT="X-RateLimit-Limit",
     RATELIMIT_HEADER_REMAINING="X-RateLimit-Remaining",
     RATELIMIT_HEADER_RESET="X-RateLimit-Reset",
+    # Общий лимит тела запроса (самое большое тело — ops upload): werkzeug
+    # обрывает чтение на лимите, в т.ч. для chunked без Content-Length
+    MAX_CONTENT_LENGTH=MAX_UPLOAD_TOTAL_BYTES,
 )
 
 RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
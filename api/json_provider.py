@@ -0,0 +1,63 @@
+# api/json_provider.py
+"""
+JSON-провайдер Flask на базе orjson.
+
+Этот модуль добавляет:
+- сериализацию jsonify()/ответов через orjson (C-реализация) вместо stdlib json
+- тот же контракт, что у DefaultJSONProvider: сортировка ключей, даты в формате
+  HTTP-date, Decimal/UUID строкой, dataclass → dict
+- fallback на stdlib json, если orjson не установлен или объект ему не по силам
+- разбор входящих тел (loads) не трогает — он остаётся на stdlib json
+"""
+
+from typing import Any
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+
+    HAVE_ORJSON = True
+except Exception:  # pragma: no cover
+    orjson = None  # type: ignore
+    HAVE_ORJSON = False
+
+
+class OrjsonJSONProvider(DefaultJSONProvider):
+    """
+    DefaultJSONProvider, у которого dumps идёт через orjson.
+
+    Даты (date/datetime) orjson не сериализует сам, а отдаёт в self.default —
+    поэтому формат дат в API остаётся прежним (RFC 822), как у Flask.
+
+    loads (request.get_json() на входящих телах) сознательно остаётся stdlib:
+    разбор недоверенного ввода не меняем ради ускорения ответов.
+    """
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        # indent/separators задаёт response(); orjson и так пишет компактно
+        if kwargs.keys() - {"indent", "separators"}:
+            # нестандартные аргументы (cls, свой default, ...) — только stdlib
+            return super().dumps(obj, **kwargs)
+
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=self.default, option=option).decode("utf-8")
+        except orjson.JSONEncodeError:
+            # например, int вне 64 бит — stdlib справится
+            return super().dumps(obj, **kwargs)
+
+
+def setup_json_provider(app):
+    """
+    Подключает OrjsonJSONProvider к приложению (no-op без orjson).
+
+    Args:
+        app: Flask application instance
+    """
+    if HAVE_ORJSON:
+        app.json = OrjsonJSONProvider(app)
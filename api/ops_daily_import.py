@@ -21,13 +21,27 @@ import hashlib
 import json
 import multiprocessing
 import os
+import re
 import subprocess
 import sys
+import threading
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
 
 from flask import jsonify, request, send_file
+from werkzeug.exceptions import RequestEntityTooLarge
+
+# Run logs: orjson (C, bytes in/out) → stdlib json fallback
+try:
+    import orjson
+
+    HAVE_ORJSON = True
+except Exception:  # pragma: no cover
+    orjson = None  # type: ignore
+    HAVE_ORJSON = False
 
 # Paths
 BASE_DIR = Path(__file__).parent.parent
@@ -40,12 +54,24 @@ LOGS_DIR.mkdir(parents=True, exist_ok=True)
 
 ALLOWED_MODES = {"auto", "files"}
 MAX_FILES = 50
+# runs list: ?status= filter (compiled once, not per request)
+_STATUS_FILTER_RE = re.compile(r"[A-Z][A-Z0-9_]{0,39}")
+# multipart field names accepted by the upload endpoint
+_UPLOAD_FIELDS = frozenset({"files", "files[]"})
 # Upload limits (env-overridable)
 MAX_UPLOAD_FILE_MB = int(os.getenv("OPS_UPLOAD_MAX_FILE_MB", "50"))
 MAX_UPLOAD_TOTAL_MB = int(os.getenv("OPS_UPLOAD_MAX_TOTAL_MB", "200"))
 
 MAX_UPLOAD_FILE_BYTES = MAX_UPLOAD_FILE_MB * 1024 * 1024
 MAX_UPLOAD_TOTAL_BYTES = MAX_UPLOAD_TOTAL_MB * 1024 * 1024
+# Upload is streamed to disk and hashed chunk by chunk: memory stays O(chunk), not O(file)
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Downloads: cache lifetime for immutable archive/quarantine files and the size
+# from which proxies are asked not to buffer the response
+DOWNLOAD_MAX_AGE_S = 60
+DOWNLOAD_STREAM_HINT_BYTES = 100 * 1024 * 1024
+# Files of one upload request are spooled+hashed in parallel by up to N threads
+UPLOAD_WORKERS = max(1, int(os.getenv("OPS_UPLOAD_WORKERS", "4")))
 # Upload dedupe policy (content-based, SHA-256 within INBOX)
 # Values: off | reject | skip | rename
 # NOTE: in PR-1, "skip" behaves like "reject" but keeps HTTP 200 and reports DUPLICATE in rejected[].
@@ -59,6 +85,76 @@ STDIO_TAIL_CHARS = int(os.getenv("OPS_DAILY_IMPORT_STDIO_TAIL_CHARS", "2000"))
 OPS_DB_REGISTRY_DEBUG = os.getenv("OPS_DB_REGISTRY_DEBUG", "").strip().lower() in {"1", "true", "yes", "y", "on"}
 
 
+def _read_json_file(path: Path):
+    """Load a JSON run log. Raises json.JSONDecodeError on partial/invalid JSON."""
+    if HAVE_ORJSON:
+        # orjson.JSONDecodeError is a subclass of json.JSONDecodeError
+        return orjson.loads(path.read_bytes())
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _dump_json_bytes(data) -> bytes:
+    """Serialize a run log as indented UTF-8 JSON (non-ASCII kept as-is)."""
+    if HAVE_ORJSON:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+
+
+# FS fallback for GET /runs: parsed logs keyed by path, valid while (mtime_ns, size) match
+_RUN_LOG_CACHE: dict[str, tuple[tuple[int, int], dict]] = {}
+# кэш общий для потоков gunicorn (--threads): чистка/чтение/запись — под локом,
+# разбор JSON — вне его
+_RUN_LOG_CACHE_LOCK = threading.Lock()
+
+
+def _iter_run_logs(logs_dir: Path):
+    """
+    Yield (path, mtime, run_data) for *.json run logs, newest first.
+
+    One os.scandir() pass (type + stat from the dirent); files are parsed lazily
+    and only when new or changed since the previous request. run_data is None for
+    partial JSON (log being rewritten) — such files are never cached.
+    """
+    entries = []
+    with os.scandir(logs_dir) as it:
+        for entry in it:
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append((entry.path, st))
+
+    # drop cache entries for logs that disappeared
+    live = {p for p, _ in entries}
+    with _RUN_LOG_CACHE_LOCK:
+        for stale in _RUN_LOG_CACHE.keys() - live:
+            del _RUN_LOG_CACHE[stale]
+
+    entries.sort(key=lambda e: e[1].st_mtime, reverse=True)
+    for path, st in entries:
+        key = (st.st_mtime_ns, st.st_size)
+        with _RUN_LOG_CACHE_LOCK:
+            cached = _RUN_LOG_CACHE.get(path)
+        if cached is not None and cached[0] == key:
+            run_data = cached[1]
+        else:
+            try:
+                run_data = _read_json_file(Path(path))
+            except json.JSONDecodeError:
+                run_data = None
+            except OSError:
+                continue
+            if run_data is not None:
+                with _RUN_LOG_CACHE_LOCK:
+                    _RUN_LOG_CACHE[path] = (key, run_data)
+        yield Path(path), st.st_mtime, run_data
+
+
 def _normalize_payload(payload: dict) -> tuple[str, list[str]]:
     """
     Validate and normalize user payload for subprocess execution.
@@ -103,6 +199,11 @@ def _normalize_payload(payload: dict) -> tuple[str, list[str]]:
     return mode, safe_files
 
 
+# Запрещённое в имени загружаемого файла: разделители путей, NUL, ведущий '-'
+# (option-injection в argparse) и любые '..' (traversal)
+_BAD_NAME_RE = re.compile(r"[/\\\x00]|^-|\.\.")
+
+
 def _validate_inbox_xlsx_basename(raw: str) -> str:
     """
     Return safe basename (unicode preserved) or raise ValueError.
@@ -120,16 +221,9 @@ def _validate_inbox_xlsx_basename(raw: str) -> str:
     if not name:
         raise ValueError(f"Invalid filename: {raw}")
 
-    # Block traversal / path separators explicitly (Linux Path.name won't catch backslash)
-    if "/" in name or "\\" in name:
-        raise ValueError(f"Invalid filename: {raw}")
-    if "\x00" in name:
-        raise ValueError(f"Invalid filename: {raw}")
-    if name.startswith("-"):
-        raise ValueError(f"Invalid filename: {raw}")
-
-    # Block explicit parent dir tokens (defense-in-depth)
-    if name == ".." or name.startswith("..") or ".." in name:
+    # Block traversal / path separators explicitly (Linux Path.name won't catch backslash),
+    # NUL, leading '-' and any '..' token — one regex scan instead of several passes
+    if _BAD_NAME_RE.search(name):
         raise ValueError(f"Invalid filename: {raw}")
 
     if not name.lower().endswith(".xlsx"):
@@ -139,6 +233,17 @@ def _validate_inbox_xlsx_basename(raw: str) -> str:
     return name
 
 
+@lru_cache(maxsize=8)
+def _resolved_base(base: Path) -> str:
+    """
+    Base dir for downloads, realpath'ed once per distinct path.
+
+    Кэш по самому пути, а не по kind: *_DIR можно подменить (тесты/конфиг),
+    и новый путь просто даст новую запись.
+    """
+    return os.path.realpath(base)
+
+
 def register_ops_daily_import(app, require_api_key, db_connect, db_query):
     """Register ops daily-import endpoints"""
 
@@ -158,47 +263,31 @@ def register_ops_daily_import(app, require_api_key, db_connect, db_query):
                 })
         return files
 
-    def _allocate_non_conflicting_name(dest_dir: Path, desired: str) -> str:
-        p = dest_dir / desired
-        if not p.exists():
+    def _allocate_non_conflicting_name(dest_dir: Path, desired: str,
+                                       existing: set[str] | None = None) -> str:
+        """
+        First free name among desired, "stem (1).ext", "stem (2).ext", ...
+
+        existing — снимок os.listdir(dest_dir): кандидаты проверяются в памяти,
+        а не stat() на каждый. Без снимка — по-старому, через exists().
+        """
+        if existing is None:
+            def taken(name: str) -> bool:
+                return (dest_dir / name).exists()
+        else:
+            taken = existing.__contains__
+
+        if not taken(desired):
             return desired
 
         stem = Path(desired).stem
         suffix = Path(desired).suffix  # ".xlsx"
         for i in range(1, 10_000):
             candidate = f"{stem} ({i}){suffix}"
-            if not (dest_dir / candidate).exists():
+            if not taken(candidate):
                 return candidate
         raise ValueError("Too many name conflicts")
 
-    def _save_upload_atomic(file_storage, dest_dir: Path, saved_name: str,
-                            max_bytes: int) -> int:
-        dest_dir.mkdir(parents=True, exist_ok=True)
-
-        tmp_path = dest_dir / f".upload-{uuid.uuid4().hex}.tmp"
-        final_path = dest_dir / saved_name
-
-        written = 0
-        try:
-            with open(tmp_path, "wb") as f:
-                while True:
-                    chunk = file_storage.stream.read(1024 * 1024)
-                    if not chunk:
-                        break
-                    written += len(chunk)
-                    if written > max_bytes:
-                        raise ValueError("FILE_TOO_LARGE")
-                    f.write(chunk)
-
-            os.replace(str(tmp_path), str(final_path))
-            return written
-        finally:
-            if tmp_path.exists():
-                try:
-                    tmp_path.unlink()
-                except Exception:
-                    pass
-
     # ==================== SHA-256 / Dedupe helpers (PR-1) ====================
 
     def _write_upload_tmp_with_sha(file_storage, dest_dir: Path,
@@ -211,10 +300,20 @@ def register_ops_daily_import(app, require_api_key, db_connect, db_query):
         tmp_path = dest_dir / f".upload-{uuid.uuid4().hex}.tmp"
         written = 0
         h = hashlib.sha256()
+        stream = file_storage.stream
+        # readinto() в один переиспользуемый буфер (как hashlib.file_digest):
+        # без нового bytes на каждый чанк; потоки без readinto читаем по-старому
+        readinto = getattr(stream, "readinto", None)
+        buf = bytearray(UPLOAD_CHUNK_BYTES)
+        view = memoryview(buf)
         try:
             with open(tmp_path, "wb") as f:
                 while True:
-                    chunk = file_storage.stream.read(1024 * 1024)
+                    if readinto is not None:
+                        n = readinto(buf)
+                        chunk = view[:n] if n else b""
+                    else:
+                        chunk = stream.read(UPLOAD_CHUNK_BYTES)
                     if not chunk:
                         break
                     written += len(chunk)
@@ -222,6 +321,10 @@ def register_ops_daily_import(app, require_api_key, db_connect, db_query):
                         raise ValueError("FILE_TOO_LARGE")
                     h.update(chunk)
                     f.write(chunk)
+                # данные на диске до os.replace в INBOX: после сбоя в INBOX не окажется
+                # файла с нужным именем, но обрезанным содержимым
+                f.flush()
+                os.fsync(f.fileno())
             return tmp_path, written, h.hexdigest()
         except Exception:
             if tmp_path.exists():
@@ -231,10 +334,45 @@ def register_ops_daily_import(app, require_api_key, db_connect, db_query):
                     pass
             raise
 
+    def _spool_one_upload(fs):
+        """
+        Validate name, stream to tmp and hash one upload.
+        Returns (safe_name, tmp_path, size_bytes, sha256_hex) or the raised exception.
+        """
+        try:
+            safe_name = _validate_inbox_xlsx_basename(getattr(fs, "filename", None) or "")
+            tmp_path, size, sha256 = _write_upload_tmp_with_sha(
+                fs, INBOX_DIR, MAX_UPLOAD_FILE_BYTES
+            )
+            return safe_name, tmp_path, size, sha256
+        except Exception as e:
+            return e
+
+    def _spool_uploads(fs_list) -> list:
+        """
+        Spool all uploads of a request, in input order.
+
+        Файлы независимы, а запись и sha256 отпускают GIL — пишем их пулом потоков.
+        Всё, что зависит от порядка (имена, дедуп внутри пачки, общий лимит, БД),
+        остаётся последовательным в вызывающем коде.
+        """
+        workers = min(UPLOAD_WORKERS, len(fs_list))
+        if workers <= 1:
+            return [_spool_one_upload(fs) for fs in fs_list]
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            return list(ex.map(_spool_one_upload, fs_list))
+
     def _finalize_upload_tmp(tmp_path: Path, dest_dir: Path,
                              saved_name: str) -> Path:
+        """
+        Publish tmp under saved_name without overwriting (FileExistsError if taken).
+
+        os.link, а не os.replace: файл, появившийся в INBOX после снимка имён
+        (и не известный БД), не затирается молча.
+        """
         final_path = dest_dir / saved_name
-        os.replace(str(tmp_path), str(final_path))
+        os.link(str(tmp_path), str(final_path))
+        tmp_path.unlink(missing_ok=True)
         return final_path
 
     # ==================== Atomic log writes ====================
@@ -244,8 +382,8 @@ def register_ops_daily_import(app, require_api_key, db_connect, db_query):
         tmp_file = LOGS_DIR / f"{run_id}.json.tmp"
 
         try:
-            with open(tmp_file, "w", encoding="utf-8") as f:
-               json.dump(data, f, indent=2, ensure_ascii=False)
+            with open(tmp_file, "wb") as f:
+                f.write(_dump_json_bytes(data))
 
             os.replace(str(tmp_file), str(log_file))
         except Exception as e:
@@ -337,6 +475,20 @@ def register_ops_daily_import(app, require_api_key, db_connect, db_query):
             return True, rows[0]
         return False, _db_get_inbox_upload_by_sha256(conn, sha256)
 
+    def _db_mark_inbox_upload_deleted(conn, sha256: str) -> None:
+        """Release the INBOX row of an upload that was not published."""
+        _db_query_write(
+            conn,
+            """
+            UPDATE public.ops_daily_import_uploads
+            SET status='DELETED',
+                moved_at=now()
+            WHERE status = 'INBOX'
+              AND sha256 = %s
+            """,
+            (sha256,),
+        )
+
     def _is_saved_name_unique_violation(e: Exception) -> bool:
         # psycopg2: UniqueViolation -> pgcode 23505, constraint in e.diag.constraint_name
         if getattr(e, "pgcode", None) != "23505":
@@ -682,22 +834,32 @@ def register_ops_daily_import(app, require_api_key, db_connect, db_query):
     @require_api_key
     def ops_daily_import_inbox_upload():
         try:
-            # total request size pre-check (best-effort)
+            # total request size pre-check: до первого обращения к request.files,
+            # т.е. тело не читается и не разбирается вовсе (только заголовок)
             cl = request.content_length
             if cl is not None and cl > MAX_UPLOAD_TOTAL_BYTES:
                 return jsonify({"error": "payload_too_large"}), 413
 
-            # accept both field names
+            # accept both field names: один проход по MultiDict, лимит MAX_FILES — на лету.
+            # Порядок — по полям в порядке первого появления имени, внутри поля — как
+            # в форме (MultiDict группирует значения по ключу: files a, files[] b,
+            # files c → a, c, b)
             fs_list = []
-            fs_list.extend(request.files.getlist("files"))
-            fs_list.extend(request.files.getlist("files[]"))
+            try:
+                for field, fs in request.files.items(multi=True):
+                    if field not in _UPLOAD_FIELDS:
+                        continue
+                    if len(fs_list) == MAX_FILES:
+                        return jsonify(
+                            {"error": f"Too many files (max {MAX_FILES})"}), 400
+                    fs_list.append(fs)
+            except RequestEntityTooLarge:
+                # MAX_CONTENT_LENGTH приложения (api/app.py) сработал при разборе тела
+                return jsonify({"error": "payload_too_large"}), 413
 
             if not fs_list:
                 return jsonify(
                     {"error": "No files provided (field: files)"}), 400
-            if len(fs_list) > MAX_FILES:
-                return jsonify(
-                    {"error": f"Too many files (max {MAX_FILES})"}), 400
 
             uploaded = []
             rejected = []
@@ -720,15 +882,19 @@ def register_ops_daily_import(app, require_api_key, db_connect, db_query):
                 return jsonify({"error": "db_unavailable", "message": err or "db_connect failed"}), 503
 
             total_written = 0
+            spooled = []
+            # имена в INBOX: один listdir на запрос (лениво), дальше — проверки в памяти.
+            # Гонку с параллельным upload'ом ловит unique saved_name в БД (retry ниже).
+            inbox_names: set[str] | None = None
             try:
-                for fs in fs_list:
+                # tmp+sha256 по всем файлам (параллельно), затем БД/имена/лимиты — строго по порядку
+                spooled = _spool_uploads(fs_list)
+                for fs, prepared in zip(fs_list, spooled):
                     original = getattr(fs, "filename", None) or ""
                     try:
-                        safe_name = _validate_inbox_xlsx_basename(original)
-
-                        tmp_path, size, sha256 = _write_upload_tmp_with_sha(
-                            fs, INBOX_DIR, MAX_UPLOAD_FILE_BYTES
-                        )
+                        if isinstance(prepared, BaseException):
+                            raise prepared
+                        safe_name, tmp_path, size, sha256 = prepared
 
                         if total_written + size > MAX_UPLOAD_TOTAL_BYTES:
                             try:
@@ -766,9 +932,12 @@ def register_ops_daily_import(app, require_api_key, db_connect, db_query):
                         stem = Path(safe_name).stem
                         suffix = Path(safe_name).suffix
 
+                        if inbox_names is None:
+                            inbox_names = set(os.listdir(INBOX_DIR))
+
                         for attempt in range(5):
                             name_hint = safe_name if attempt == 0 else f"{stem} ({attempt}){suffix}"
-                            candidate = _allocate_non_conflicting_name(INBOX_DIR, name_hint)
+                            candidate = _allocate_non_conflicting_name(INBOX_DIR, name_hint, inbox_names)
                             try:
                                 ok, info = _db_try_register_inbox_upload(
                                     conn,
@@ -778,15 +947,37 @@ def register_ops_daily_import(app, require_api_key, db_connect, db_query):
                                     size_bytes=size,
                                     metadata={"dedupe_policy": dedupe_policy},
                                 )
-                                saved_name = candidate
-                                break
                             except Exception as e:
                                 if _is_saved_name_unique_violation(e):
                                     continue
                                 raise
 
+                            if not ok:
+                                # DUPLICATE по sha256 — публиковать нечего
+                                saved_name = candidate
+                                break
+
+                            try:
+                                _finalize_upload_tmp(tmp_path, INBOX_DIR, candidate)
+                            except FileExistsError:
+                                # имя занял файл, появившийся после снимка INBOX:
+                                # снимаем свою строку в БД и пробуем следующее имя
+                                _db_mark_inbox_upload_deleted(conn, sha256)
+                                inbox_names.add(candidate)
+                                continue
+                            except Exception:
+                                # avoid INBOX ghost in DB
+                                try:
+                                    _db_mark_inbox_upload_deleted(conn, sha256)
+                                except Exception:
+                                    pass
+                                raise
+                            saved_name = candidate
+                            break
+
                         if saved_name is None:
-                            # Не смогли подобрать имя (DB unique по saved_name) — это НЕ DUPLICATE по контенту.
+                            # Не смогли подобрать имя (DB unique по saved_name или файл в INBOX) —
+                            # это НЕ DUPLICATE по контенту.
                             try:
                                 tmp_path.unlink(missing_ok=True)
                             except Exception:
@@ -817,26 +1008,7 @@ def register_ops_daily_import(app, require_api_key, db_connect, db_query):
                             })
                             continue
 
-                        try:
-                            _finalize_upload_tmp(tmp_path, INBOX_DIR, saved_name)
-                        except Exception:
-                            # avoid INBOX ghost in DB
-                            try:
-                                _db_query_write(
-                                    conn,
-                                    """
-                                    UPDATE public.ops_daily_import_uploads
-                                    SET status='DELETED',
-                                        moved_at=now()
-                                    WHERE status = 'INBOX'
-                                      AND sha256 = %s
-                                    """,
-                                    (sha256,),
-                                )
-                            except Exception:
-                                pass
-                            raise
-
+                        inbox_names.add(saved_name)
                         total_written += size
                         uploaded.append({
                             "original_name": original,
@@ -871,6 +1043,14 @@ def register_ops_daily_import(app, require_api_key, db_connect, db_query):
                                 "message": str(e),
                             })
             finally:
+                # tmp, не перенесённые в INBOX (исключение БД/rename посреди пачки),
+                # не должны копиться как .upload-*.tmp; опубликованные уже переименованы
+                for prepared in spooled:
+                    if isinstance(prepared, tuple):
+                        try:
+                            prepared[1].unlink(missing_ok=True)
+                        except Exception:
+                            pass
                 try:
                     conn.close()
                 except Exception:
@@ -1250,9 +1430,8 @@ def register_ops_daily_import(app, require_api_key, db_connect, db_query):
 
             status = (request.args.get("status") or "").strip()
             if status:
-                import re
                 status = status.upper()
-                if not re.fullmatch(r"[A-Z][A-Z0-9_]{0,39}", status):
+                if not _STATUS_FILTER_RE.fullmatch(status):
                     return jsonify({"error": "Invalid status filter"}), 400
 
             from_arg = (request.args.get("from") or "").strip()
@@ -1369,21 +1548,11 @@ def register_ops_daily_import(app, require_api_key, db_connect, db_query):
             has_more = False
 
             if LOGS_DIR.exists():
-                log_files = sorted(
-                    LOGS_DIR.glob("*.json"),
-                    key=lambda p: p.stat().st_mtime,
-                    reverse=True,
-                )
-
-                for log_file in log_files:
+                for log_file, mtime, run_data in _iter_run_logs(LOGS_DIR):
                     run_id_guess = log_file.stem
-                    started_dt = datetime.fromtimestamp(
-                        log_file.stat().st_mtime, tz=timezone.utc)
-
-                    try:
-                        with open(log_file, "r", encoding="utf-8") as f:
-                            run_data = json.load(f)
+                    started_dt = datetime.fromtimestamp(mtime, tz=timezone.utc)
 
+                    if run_data is not None:
                         run_id_guess = str(
                             run_data.get("run_id") or run_id_guess)
                         started_dt = _iso_to_dt(
@@ -1402,7 +1571,7 @@ def register_ops_daily_import(app, require_api_key, db_connect, db_query):
                             "summary": summary,
                         }
 
-                    except json.JSONDecodeError:
+                    else:
                         # partial JSON while RUNNING
                         item = {
                             "run_id": run_id_guess,
@@ -1415,9 +1584,6 @@ def register_ops_daily_import(app, require_api_key, db_connect, db_query):
                             "summary": {},
                         }
 
-                    except IOError:
-                        continue
-
                     # filters
                     if status and (
                             str(item.get("status") or "").upper() != status):
@@ -1579,8 +1745,7 @@ def register_ops_daily_import(app, require_api_key, db_connect, db_query):
                 return jsonify({"error": "Run not found"}), 404
 
             try:
-                with open(log_file, "r", encoding="utf-8") as f:
-                    run_data = json.load(f)
+                run_data = _read_json_file(log_file)
                 return jsonify(_normalize_run_detail(run_data, None)), 200
 
             except json.JSONDecodeError:
@@ -1608,7 +1773,7 @@ def register_ops_daily_import(app, require_api_key, db_connect, db_query):
         """
         GET /api/v1/ops/files/{kind}/{relpath} - download files
 
-        Security: is_relative_to() path traversal protection (from v1.2.2.1)
+        Security: realpath + prefix check path traversal protection (from v1.2.2.1)
         """
         try:
             if kind == "archive":
@@ -1620,27 +1785,35 @@ def register_ops_daily_import(app, require_api_key, db_connect, db_query):
             else:
                 return jsonify({"error": "Invalid kind"}), 400
 
-            # Path traversal protection: is_relative_to() or commonpath
-            file_path = (base / relpath).resolve()
-            base_resolved = base.resolve()
+            # Path traversal protection: один realpath на запрос (база — из кэша),
+            # дальше строковая проверка префикса. Симлинки и ".." раскрыты realpath'ом;
+            # абсолютный relpath в join отбрасывает базу и тоже не пройдёт проверку.
+            base_real = _resolved_base(base)
+            file_path = os.path.realpath(os.path.join(base_real, relpath))
+            if file_path != base_real and not file_path.startswith(base_real + os.sep):
+                return jsonify({"error": "Path traversal blocked"}), 403
 
-            try:
-                # Python 3.9+
-                if not file_path.is_relative_to(base_resolved):
-                    return jsonify({"error": "Path traversal blocked"}), 403
-            except AttributeError:
-                # Python 3.8 fallback
-                try:
-                    common = os.path.commonpath([base_resolved, file_path])
-                    if common != str(base_resolved):
-                        return jsonify({"error": "Path traversal blocked"}), 403
-                except ValueError:
-                    return jsonify({"error": "Path traversal blocked"}), 403
-
-            if not file_path.exists():
+            if not os.path.isfile(file_path):
                 return jsonify({"error": "File not found"}), 404
 
-            return send_file(str(file_path), as_attachment=True)
+            # путь (а не открытый файл) → werkzeug отдаёт его через wsgi.file_wrapper,
+            # и gunicorn/uwsgi шлют тело sendfile(2) без копирования в Python.
+            # conditional=True: ETag/If-None-Match и Range → 206 (докачка, параллельные куски)
+            resp = send_file(file_path, as_attachment=True, conditional=True, etag=True)
+
+            resp.cache_control.private = True
+            if kind == "logs":
+                # лог RUNNING-запуска дописывается — только ревалидация по ETag
+                resp.cache_control.no_cache = True
+            else:
+                # файлы в archive/quarantine после записи не меняются
+                resp.cache_control.no_cache = None
+                resp.cache_control.max_age = DOWNLOAD_MAX_AGE_S
+
+            if (resp.content_length or 0) >= DOWNLOAD_STREAM_HINT_BYTES:
+                # большие файлы: reverse proxy (nginx) отдаёт поток без буферизации
+                resp.headers["X-Accel-Buffering"] = "no"
+            return resp
 
         except Exception as e:
             return jsonify({"error": str(e)}), 500
@@ -1,5 +1,5 @@
 # api/validation.py
-from typing import Optional, Tuple, Type, TypeVar
+from typing import Mapping, Optional, Tuple, Type, TypeVar
 
 from flask import jsonify, request
 from pydantic import BaseModel, ValidationError
@@ -21,9 +21,16 @@ def serialize_validation_error(e: ValidationError) -> dict:
     return {"error": "validation_error", "details": details}
 
 
-def validate_query_params(model: Type[T]) -> Tuple[Optional[T], Optional[tuple]]:
+def validate_query_params(
+    model: Type[T],
+    args: Optional[Mapping] = None,
+) -> Tuple[Optional[T], Optional[tuple]]:
     """
-    Валидирует request.args через переданную Pydantic-модель.
+    Валидирует request.args (или явно переданные args) через Pydantic-модель.
+
+    args — MultiDict/Mapping с параметрами; по умолчанию request.args.
+    С явными args request context не нужен (фоновые задачи, тесты);
+    для error_response по-прежнему нужен app context (jsonify).
 
     Возвращает (params, error_response):
       * если всё ок: (params, None)
@@ -31,8 +38,14 @@ def validate_query_params(model: Type[T]) -> Tuple[Optional[T], Optional[tuple]]
 
     error_response можно прямо return'нуть из вьюхи.
     """
+    if args is None:
+        args = request.args
+    # MultiDict: для повторяющихся ключей — первое значение, как и раньше
+    data = args.to_dict(flat=True) if hasattr(args, "to_dict") else dict(args)
     try:
-        params = model.model_validate(request.args.to_dict(flat=True))
+        # сразу в скомпилированный (pydantic-core) валидатор модели — то же, что
+        # model_validate() без аргументов, но без обёртки на каждый запрос
+        params = model.__pydantic_validator__.validate_python(data)
         return params, None
     except ValidationError as e:
         return None, (jsonify(serialize_validation_error(e)), 400)
@@ -1,18 +1,23 @@
 # scripts/load_utils.py
 
+import codecs
 import logging
 import math
 import os
 import re
+import unicodedata
 from datetime import date, datetime
 from functools import lru_cache
-from typing import Any, Dict, Iterable, Optional, Tuple
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
 
 import numpy as np
 import openpyxl
 import pandas as pd
 import psycopg2
+from openpyxl.utils.cell import coordinate_to_tuple
 from pandas.api import types as pd_types
+from psycopg2.extras import execute_batch
 
 __all__ = [
     "get_conn",
@@ -61,26 +66,33 @@ def get_conn():
 # =========================
 # Utils
 # =========================
+_WS_RE = re.compile(r"\s+")
+
+# Ключи заголовков: регулярки компилируем один раз, _norm_key() зовётся на каждую ячейку шапки
+_KEY_TRANS = str.maketrans({"ё": "е"})
+# Любая серия «не букв/цифр» (пробелы, %, пунктуация, сами подчёркивания) -> один «_»
+_KEY_SEP_RE = re.compile(r"[^a-z0-9а-я]+")
+_KEY_DISCOUNT_RE = re.compile(r"(цена_со_скидкой)(_?\d+_?)?$")
+
+
 def _norm(s: Any) -> str:
     if s is None:
         return ""
-    s = str(s).strip()
-    s = s.replace("\r", " ").replace("\n", " ")
-    s = re.sub(r"\s+", " ", s)
-    return s
+    return _WS_RE.sub(" ", str(s).strip())
 
 
 def _norm_key(s: Any) -> str:
-    s = _norm(s).lower()
-    s = s.replace("ё", "е")
-    s = s.replace("%", " % ")
-    s = re.sub(r"\s+", "_", s)
-    s = re.sub(r"[^a-z0-9а-я_]+", "_", s)
-    s = re.sub(r"_+", "_", s).strip("_")
-    # частые артефакты мультишапки
-    s = s.replace("алк__", "алк_").replace("емк__л", "емк_л")
+    s = _norm(s)
+    if s.isascii():
+        # быстрый путь: для ASCII NFKC ничего не меняет, а casefold() == lower()
+        s = s.lower()
+    else:
+        # NFKC: полноширинные/совместимые формы («Ｃｏｄｅ» -> «Code»), «е» + U+0308 -> «ё»;
+        # casefold: регистронезависимое сравнение («ß» -> «ss»)
+        s = unicodedata.normalize("NFKC", s).casefold().translate(_KEY_TRANS)
+    s = _KEY_SEP_RE.sub("_", s).strip("_")
     # «Цена со скидкой 0%» -> «цена_со_скидкой»
-    s = re.sub(r"(цена_со_скидкой)(_?\d+_?)?$", "цена_со_скидкой", s)
+    s = _KEY_DISCOUNT_RE.sub("цена_со_скидкой", s)
     return s
 
 
@@ -135,14 +147,23 @@ def _normalize_site(value: Any) -> Optional[str]:
     return site
 
 
+# Число внутри строки: «1 000», «1 000,50», «-42.5», «12,5 %», «1\xa0000 руб.»
+_FLOAT_RE = re.compile(r"[-+]?\d+(?:[ \xa0\u202f\d])*(?:[.,]\d+)?")
+# Один проход вместо цепочки .replace(): убрать разделители разрядов, запятая -> точка
+_FLOAT_TRANS = str.maketrans({" ": None, "\xa0": None, "\u202f": None, ",": "."})
+
+
 def _to_float(x: Any) -> Optional[float]:
-    if x is None or (isinstance(x, float) and math.isnan(x)):
+    if x is None or isinstance(x, bool):
         return None
-    sx = str(x)
-    m = re.search(r"[-+]?\d+(?:[ \d])*(?:[.,]\d+)?", sx)
+    # числовые ячейки (pandas/openpyxl) — без круга через str()
+    if isinstance(x, (int, float, np.integer, np.floating)):
+        v = float(x)
+        return v if math.isfinite(v) else None
+    m = _FLOAT_RE.search(str(x))
     if not m:
         return None
-    num = m.group(0).replace(" ", "").replace(",", ".")
+    num = m.group(0).translate(_FLOAT_TRANS)
     try:
         v = float(num)
         return v if math.isfinite(v) else None
@@ -287,27 +308,33 @@ COLMAP: Dict[str, Optional[str]] = {
 }
 
 
-def _canonicalize_headers(cols: Iterable[str]) -> Dict[str, Optional[str]]:
+def _canonical_name(key: str) -> Optional[str]:
+    """normalized_key -> canonical_name (или None для игнора)"""
+    if not key or key.startswith("unnamed"):
+        return None
+    # цена со скидкой с процентом/суффиксом в шапке
+    if key.startswith("цена_со_скидкой"):
+        return "price_discount"
+    return COLMAP.get(key)  # может быть None (игнор или неизвестная колонка)
+
+
+@lru_cache(maxsize=256)
+def _canonicalize_headers_cached(cols: Tuple[str, ...]) -> Mapping[str, Optional[str]]:
+    # прайсы одного поставщика приходят с одинаковой шапкой — считаем её один раз;
+    # результат общий для всех вызовов, поэтому отдаём read-only view
+    return MappingProxyType({c: _canonical_name(_norm_key(c)) for c in cols})
+
+
+def _canonicalize_headers(cols: Iterable[str]) -> Mapping[str, Optional[str]]:
     """old_col -> canonical_name (или None для игнора)"""
-    mapping: Dict[str, Optional[str]] = {}
-    for c in cols:
-        key = _norm_key(c)
-        if key == "" or key.startswith("unnamed"):
-            mapping[c] = None
-            continue
-        # цена со скидкой с процентом в шапке
-        if key.startswith("цена_со_скидкой"):
-            mapping[c] = "price_discount"
-            continue
-        if key in COLMAP:
-            mapping[c] = COLMAP[key]  # может быть None (игнор)
-        else:
-            mapping[c] = None
-    return mapping
+    return _canonicalize_headers_cached(tuple(cols))
 
 
-def _find_header_row(xls_path: str, sheet: Any, max_rows: int = 30) -> int:
-    """Ищем строку заголовка по наличию ключей ('код'/'code'/'артикул') в первых max_rows строках."""
+def _find_header_row(xls_path: Any, sheet: Any, max_rows: int = 30) -> int:
+    """
+    Ищем строку заголовка по наличию ключей ('код'/'code'/'артикул') в первых max_rows строках.
+    xls_path — путь или уже открытый pd.ExcelFile.
+    """
     df_top = pd.read_excel(xls_path, sheet_name=sheet, header=None, nrows=max_rows, dtype=str)
     for i, row in df_top.iterrows():
         vals = [_norm_key(v) for v in row.values if pd.notna(v)]
@@ -322,9 +349,20 @@ def _get_discount_from_cell(xls_path: str, sheet: Any, cell_addr: str = "S5") ->
     sheet — индекс (int) или имя (str).
     """
     try:
+        row, col = coordinate_to_tuple(cell_addr)
         wb = openpyxl.load_workbook(xls_path, data_only=True, read_only=True)
-        ws = wb.worksheets[sheet] if isinstance(sheet, int) else wb[str(sheet)]
-        raw = ws[cell_addr].value
+        try:
+            ws = wb.worksheets[sheet] if isinstance(sheet, int) else wb[str(sheet)]
+            # values_only: без создания Cell-объектов, читаем только нужную строку/колонку
+            raw = next(
+                ws.iter_rows(
+                    min_row=row, max_row=row, min_col=col, max_col=col, values_only=True
+                ),
+                (None,),
+            )[0]
+        finally:
+            # read_only-книга держит файл открытым до явного close()
+            wb.close()
         if raw is None:
             return None
         s = str(raw).strip().replace(",", ".")
@@ -350,6 +388,9 @@ def _excel_read(
     """
     Читает Excel. Возвращает (df, header_row_base, used_two_rows, discount_pct_from_header)
     Если в строке ниже шапки видим проценты ('0%'), читаем header=[hdr,hdr+1] и считаем, что в шапке указан % скидки.
+
+    Книга открывается один раз (pd.ExcelFile; openpyxl грузит её в read_only-режиме),
+    все три прохода — поиск шапки, peek и основное чтение — идут по уже открытой книге.
     """
     # sheet -> индекс или имя
     try:
@@ -357,11 +398,21 @@ def _excel_read(
     except ValueError:
         sh = sheet if sheet not in (None, "") else 0
 
+    with pd.ExcelFile(path) as xls:
+        return _excel_read_book(xls, sh, header)
+
+
+def _excel_read_book(
+    xls: pd.ExcelFile,
+    sh: Any,
+    header: Optional[int],
+) -> Tuple[pd.DataFrame, int, bool, Optional[float]]:
+    """Тело _excel_read() поверх уже открытой книги."""
     # базовая строка заголовка
-    hdr_base = _find_header_row(path, sh) if header is None else header
+    hdr_base = _find_header_row(xls, sh) if header is None else header
 
     # посмотреть следующую строку
-    peek = pd.read_excel(path, sheet_name=sh, header=None, nrows=hdr_base + 2, dtype=str)
+    peek = pd.read_excel(xls, sheet_name=sh, header=None, nrows=hdr_base + 2, dtype=str)
     second = peek.iloc[hdr_base + 1] if len(peek.index) > hdr_base + 1 else None
     use_two_rows = False
     disc_hdr: Optional[float] = None
@@ -372,7 +423,7 @@ def _excel_read(
             use_two_rows = True
 
     if use_two_rows:
-        df_raw = pd.read_excel(path, sheet_name=sh, header=[hdr_base, hdr_base + 1], dtype=str)
+        df_raw = pd.read_excel(xls, sheet_name=sh, header=[hdr_base, hdr_base + 1], dtype=str)
         # расплющим мультишапку и соберём % скидки, если он указан во второй строке под «Цена со скидкой»
         flat_cols = []
         if isinstance(df_raw.columns, pd.MultiIndex):
@@ -392,7 +443,7 @@ def _excel_read(
         else:
             df = df_raw.copy()
     else:
-        df = pd.read_excel(path, sheet_name=sh, header=hdr_base, dtype=str)
+        df = pd.read_excel(xls, sheet_name=sh, header=hdr_base, dtype=str)
 
     print(
         f"[excel] sheet={sh!r}, header_row={'[{},{}]'.format(hdr_base, hdr_base + 1) if use_two_rows else hdr_base}, "
@@ -401,20 +452,47 @@ def _excel_read(
     return df, hdr_base, use_two_rows, disc_hdr
 
 
+# Кодировку и разделитель CSV определяем по началу файла, а не по всему файлу
+CSV_SNIFF_BYTES = 8192
+
+
+def _detect_encoding(head: bytes) -> str:
+    """
+    Определяет кодировку CSV по первым байтам файла.
+
+    Быстрые пути: BOM -> utf-8-sig, чистый ASCII -> utf-8 (одна C-проверка без декодирования).
+    Иначе пробуем utf-8 (инкрементально, чтобы обрезанный на границе буфера
+    многобайтовый символ не уводил в cp1251), затем cp1251 и latin1.
+    """
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if head.isascii():
+        return "utf-8"
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    try:
+        head.decode("cp1251")
+        return "cp1251"
+    except UnicodeDecodeError:
+        return "latin1"
+
+
+def _csv_engine(sep: str) -> str:
+    """
+    C-парсер pandas для односимвольного разделителя (все варианты из Sniffer),
+    python-движок — только для regex/многосимвольных sep, заданных вручную.
+    """
+    return "c" if len(sep) == 1 else "python"
+
+
 def _csv_read(path: str, sep: Optional[str]) -> Tuple[pd.DataFrame, str]:
     if sep is None:
         with open(path, "rb") as fb:
-            head = fb.read(4096)
-        enc = None
-        for enc_try in ("utf-8", "utf-8-sig", "cp1251", "latin1"):
-            try:
-                head.decode(enc_try)
-                enc = enc_try
-                break
-            except UnicodeDecodeError:
-                continue
-        if enc is None:
-            enc = "latin1"
+            head = fb.read(CSV_SNIFF_BYTES)
+        enc = _detect_encoding(head)
         import csv as _csv
 
         try:
@@ -425,11 +503,11 @@ def _csv_read(path: str, sep: Optional[str]) -> Tuple[pd.DataFrame, str]:
         except Exception:
             sep = ","
         df = pd.read_csv(
-            path, sep=sep, engine="python", encoding=enc, dtype=str, on_bad_lines="warn"
+            path, sep=sep, engine=_csv_engine(sep), encoding=enc, dtype=str, on_bad_lines="warn"
         )
         print(f"[csv] encoding={enc}, sep='{sep}', columns={list(df.columns)}")
     else:
-        df = pd.read_csv(path, sep=sep, engine="python", dtype=str, on_bad_lines="warn")
+        df = pd.read_csv(path, sep=sep, engine=_csv_engine(sep), dtype=str, on_bad_lines="warn")
         print(f"[csv] sep='{sep}', columns={list(df.columns)}")
     return df, sep  # type: ignore[return-value]
 
@@ -552,6 +630,38 @@ def enrich_site_from_photo_column(df: pd.DataFrame) -> pd.DataFrame:
 # =========================
 # Upsert
 # =========================
+# Строк на одну пересылку в execute_batch(). Для psycopg2 это аналог pipeline-режима
+# psycopg3: страница уходит одним запросом, round-trip на страницу, а не на строку.
+UPSERT_PAGE_SIZE = 500
+
+
+def _execute_batch_pages(cur, sql, rows, *, label, code_of, logger):
+    """
+    execute_batch() постранично, с диагностикой упавшей страницы.
+
+    Какая именно строка страницы сломалась, psycopg2 не сообщает, а повторить
+    страницу построчно нельзя (транзакция уже aborted) — поэтому логируем
+    диапазон строк и первый/последний code страницы.
+    """
+    for start in range(0, len(rows), UPSERT_PAGE_SIZE):
+        page = rows[start:start + UPSERT_PAGE_SIZE]
+        try:
+            execute_batch(cur, sql, page, page_size=UPSERT_PAGE_SIZE)
+        except Exception:
+            logger.exception(
+                "%s failed: rows %s..%s of %s, codes %s..%s",
+                label,
+                start + 1,
+                start + len(page),
+                len(rows),
+                code_of(page[0]),
+                code_of(page[-1]),
+            )
+            # Пробрасываем ошибку дальше — транзакция откатится,
+            # а load_csv.main() зафиксирует failed-импорт
+            raise
+
+
 def upsert_records(df: pd.DataFrame, asof: date | datetime):
     # приведение типов
     if "price_rub" in df.columns:
@@ -676,131 +786,132 @@ def upsert_records(df: pd.DataFrame, asof: date | datetime):
 
     asof_dt = asof if isinstance(asof, datetime) else datetime.combine(asof, datetime.min.time())
 
-    with get_conn() as conn, conn.cursor() as cur:
-        total = 0
-        prod_upd = 0
-        inv_upd = 0
-        price_hist = 0
-
-        for _, r in df.iterrows():
-            code = r.get("code")
-            if not code:
-                continue
-
-            price_list = r.get("price_rub")
-            price_file_disc = r.get("price_discount")
-
-            price_calc_disc = None
-            if disc is not None and price_list is not None:
-                price_calc_disc = round(price_list * (1.0 - disc), 2)
-
-            if prefer_discount_attr is not None:
-                # CLI-флаг/явный выбор из load_csv.main() имеет приоритет над env.
-                # load_csv уже свёл вместе --prefer-discount-cell и PREFER_S5.
-                prefer_s5 = bool(prefer_discount_attr)
-            else:
-                prefer_s5 = os.environ.get("PREFER_S5") in ("1", "true", "True")
-
-            # Contract precedence:
-            # 1) explicit discounted price from file
-            # 2) computed discount_pct (only if prefer_s5 enabled)
-            # 3) list price
-            if price_file_disc is not None:
-                eff = price_file_disc
-            elif prefer_s5 and price_calc_disc is not None:
-                eff = price_calc_disc
-            else:
-                eff = price_list
-
-            if eff is None and price_list is not None:
-                eff = price_list
-
-            if (
-                prefer_s5
-                and price_file_disc is not None
-                and price_calc_disc is not None
-                and abs(price_file_disc - price_calc_disc) > 0.01
-            ):
-                print(f"[warn] {code}: price_discount mismatch -> file={price_file_disc} vs S5={price_calc_disc}")
-
-            payload = dict(
-                code=code,
-                producer=r.get("producer"),
-                title_ru=r.get("title_ru"),
-                country=r.get("country"),
-                region=r.get("region"),
-                color=r.get("color"),
-                style=r.get("style"),
-                grapes=r.get("grapes"),
-                abv=r.get("abv"),
-                pack=r.get("pack"),
-                volume=r.get("volume"),
-
-                vintage=r.get("vintage"),
-                vivino_url=r.get("vivino_url"),
-                vivino_rating=r.get("vivino_rating"),
-                supplier=r.get("supplier"),
-                features=r.get("features"),
-                producer_site=r.get("producer_site"),
-                image_url=r.get("image_url"),
-
-                price_list_rub=price_list,
-                price_final_rub=eff,
-                price_rub=eff,
-            )
+    total = 0
+    prod_upd = 0
+    inv_upd = 0
+    price_hist = 0
+
+    # Сначала собираем параметры по всем строкам, затем отправляем пачками
+    # (execute_batch: одна пересылка на страницу вместо одной на строку).
+    # Порядок и семантика те же, что при построчном execute: дубли кода в прайсе
+    # обрабатываются последовательно, COALESCE видит результат предыдущей строки.
+    product_rows: list[dict] = []
+    price_rows: list[tuple] = []
+    inventory_rows: list[tuple] = []
+    logger = logging.getLogger(__name__)
+
+    for _, r in df.iterrows():
+        code = r.get("code")
+        if not code:
+            continue
+
+        price_list = r.get("price_rub")
+        price_file_disc = r.get("price_discount")
+
+        price_calc_disc = None
+        if disc is not None and price_list is not None:
+            price_calc_disc = round(price_list * (1.0 - disc), 2)
+
+        if prefer_discount_attr is not None:
+            # CLI-флаг/явный выбор из load_csv.main() имеет приоритет над env.
+            # load_csv уже свёл вместе --prefer-discount-cell и PREFER_S5.
+            prefer_s5 = bool(prefer_discount_attr)
+        else:
+            prefer_s5 = os.environ.get("PREFER_S5") in ("1", "true", "True")
+
+        # Contract precedence:
+        # 1) explicit discounted price from file
+        # 2) computed discount_pct (only if prefer_s5 enabled)
+        # 3) list price
+        if price_file_disc is not None:
+            eff = price_file_disc
+        elif prefer_s5 and price_calc_disc is not None:
+            eff = price_calc_disc
+        else:
+            eff = price_list
+
+        if eff is None and price_list is not None:
+            eff = price_list
+
+        if (
+            prefer_s5
+            and price_file_disc is not None
+            and price_calc_disc is not None
+            and abs(price_file_disc - price_calc_disc) > 0.01
+        ):
+            print(f"[warn] {code}: price_discount mismatch -> file={price_file_disc} vs S5={price_calc_disc}")
+
+        payload = dict(
+            code=code,
+            producer=r.get("producer"),
+            title_ru=r.get("title_ru"),
+            country=r.get("country"),
+            region=r.get("region"),
+            color=r.get("color"),
+            style=r.get("style"),
+            grapes=r.get("grapes"),
+            abv=r.get("abv"),
+            pack=r.get("pack"),
+            volume=r.get("volume"),
+
+            vintage=r.get("vintage"),
+            vivino_url=r.get("vivino_url"),
+            vivino_rating=r.get("vivino_rating"),
+            supplier=r.get("supplier"),
+            features=r.get("features"),
+            producer_site=r.get("producer_site"),
+            image_url=r.get("image_url"),
+
+            price_list_rub=price_list,
+            price_final_rub=eff,
+            price_rub=eff,
+        )
 
-            # Приводим значения к скалярным типам, чтобы psycopg2 не увидел Series
+        # Приводим значения к скалярным типам, чтобы psycopg2 не увидел Series
 
-            payload = {k: _to_scalar(v) for k, v in payload.items()}
+        payload = {k: _to_scalar(v) for k, v in payload.items()}
+        product_rows.append(payload)
+        prod_upd += 1
 
+        if eff is not None:
             try:
-                cur.execute(ins_products, payload)
-            except Exception as e:
-                print("[DEBUG] failed for code:", code)
-                print("[DEBUG] payload:", payload)
+                eff_num = float(eff)
+            except Exception:
+                logger.exception("upsert_price failed for code=%s eff=%r asof=%s", code, eff, asof_dt)
                 raise
-
-            prod_upd += 1
-
-            if eff is not None:
-                try:
-                    eff_num = float(eff)
-                    if math.isfinite(eff_num):
-                        cur.execute(
-                            "SELECT upsert_price(%s, %s, %s);",
-                            (code, eff_num, asof_dt),
-                        )
-                        price_hist += 1
-                except Exception as e:
-                    logger = logging.getLogger(__name__)
-                    logger.exception(
-                        "upsert_price failed for code=%s eff=%r asof=%s",
-                        code,
-                        eff,
-                        asof_dt,
-                    )
-                    # Пробрасываем ошибку дальше — транзакция откатится,
-                    # а load_csv.main() зафиксирует failed-импорт
-                    raise
-
-
-            if any(r.get(k) is not None for k in ("stock_total", "reserved", "stock_free")):
-                cur.execute(
-                    upsert_inventory,
-                    (
-                        code,
-                        r.get("stock_total"),
-                        r.get("reserved"),
-                        r.get("stock_free"),
-                        asof_dt.date(),
-                    ),
+            if math.isfinite(eff_num):
+                price_rows.append((code, eff_num, asof_dt))
+                price_hist += 1
+
+        if any(r.get(k) is not None for k in ("stock_total", "reserved", "stock_free")):
+            inventory_rows.append(
+                (
+                    code,
+                    r.get("stock_total"),
+                    r.get("reserved"),
+                    r.get("stock_free"),
+                    asof_dt.date(),
                 )
-                inv_upd += 1
+            )
+            inv_upd += 1
+
+        total += 1
 
-            total += 1
+    with get_conn() as conn, conn.cursor() as cur:
+        _execute_batch_pages(
+            cur, ins_products, product_rows,
+            label="products upsert", code_of=lambda p: p["code"], logger=logger,
+        )
+        _execute_batch_pages(
+            cur, "SELECT upsert_price(%s, %s, %s);", price_rows,
+            label=f"upsert_price (asof={asof_dt})", code_of=lambda p: p[0], logger=logger,
+        )
+        _execute_batch_pages(
+            cur, upsert_inventory, inventory_rows,
+            label="inventory upsert", code_of=lambda p: p[0], logger=logger,
+        )
 
         conn.commit()
-        logger = logging.getLogger(__name__)
         logger.info(
             f"Upsert done: rows={total}, products_upd={prod_upd}, price_hist={price_hist}, inventory_upd={inv_upd}"
         )
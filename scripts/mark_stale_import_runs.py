@@ -7,7 +7,6 @@ from dataclasses import dataclass
 from typing import Tuple
 
 import psycopg2
-from psycopg2.extras import RealDictCursor
 
 from scripts.db_connect import connect_postgres
 
@@ -26,11 +25,11 @@ def mark_stale_import_runs(conn: psycopg2.extensions.connection, cfg: StaleConfi
       - running with started_at older than running_minutes
       - pending with created_at older than pending_minutes
     Returns: (rolled_back_running, rolled_back_pending)
-    """
-    rolled_running = 0
-    rolled_pending = 0
 
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+    Каждый UPDATE — set-based, одним statement'ом на все stale-строки; счётчики
+    берём из cur.rowcount, не гоняя список run_id обратно клиенту (RETURNING).
+    """
+    with conn.cursor() as cur:
         cur.execute(
             """
             UPDATE import_runs
@@ -40,11 +39,10 @@ def mark_stale_import_runs(conn: psycopg2.extensions.connection, cfg: StaleConfi
             WHERE status = 'running'
               AND started_at IS NOT NULL
               AND started_at < NOW() - (%s || ' minutes')::interval
-            RETURNING run_id
             """,
             (cfg.running_minutes,),
         )
-        rolled_running = len(cur.fetchall())
+        rolled_running = cur.rowcount
 
         cur.execute(
             """
@@ -54,11 +52,10 @@ def mark_stale_import_runs(conn: psycopg2.extensions.connection, cfg: StaleConfi
                 finished_at = NOW()
             WHERE status = 'pending'
               AND created_at < NOW() - (%s || ' minutes')::interval
-            RETURNING run_id
             """,
             (cfg.pending_minutes,),
         )
-        rolled_pending = len(cur.fetchall())
+        rolled_pending = cur.rowcount
 
     return rolled_running, rolled_pending
 
@@ -3,6 +3,8 @@ import importlib
 import os
 import sys
 
+import pytest
+
 
 def _reload_app_with_env(env_overrides: dict):
     """
@@ -97,3 +99,22 @@ def test_protected_endpoints_require_api_key_invalid():
     assert client.get("/sku/ABC", headers=headers).status_code == 403
     assert client.get("/sku/ABC/price-history", headers=headers).status_code == 403
     assert client.get("/sku/ABC/inventory-history", headers=headers).status_code == 403
+
+
+def test_request_body_cap_is_set_by_app_config(app):
+    """
+    Лимит тела задаёт сам api/app.py (самое большое тело — ops upload),
+    а не регистрация ops-маршрутов.
+    """
+    from api.ops_daily_import import MAX_UPLOAD_TOTAL_BYTES
+
+    assert app.config["MAX_CONTENT_LENGTH"] == MAX_UPLOAD_TOTAL_BYTES
+
+
+def test_app_serializes_responses_with_orjson_provider(app):
+    """api/app.py подключает orjson-провайдер для jsonify() всех эндпоинтов."""
+    from api.json_provider import HAVE_ORJSON, OrjsonJSONProvider
+
+    if not HAVE_ORJSON:
+        pytest.skip("orjson is not installed")
+    assert isinstance(app.json, OrjsonJSONProvider)
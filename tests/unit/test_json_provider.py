@@ -0,0 +1,103 @@
+"""
+Unit tests for api.json_provider (orjson-backed Flask JSON provider).
+The provider must produce the same JSON values as Flask's DefaultJSONProvider.
+"""
+
+import json
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import pytest
+from flask import Flask, jsonify, request
+from flask.json.provider import DefaultJSONProvider
+
+from api.json_provider import HAVE_ORJSON, OrjsonJSONProvider, setup_json_provider
+
+pytestmark = pytest.mark.skipif(not HAVE_ORJSON, reason="orjson is not installed")
+
+
+@dataclass
+class _Point:
+    x: int
+    y: int
+
+
+_SAMPLE = {
+    "name": "Шато Марго",
+    "price": Decimal("1234.50"),
+    "id": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+    "as_of": date(2025, 1, 31),
+    "ts": datetime(2025, 1, 31, 12, 30, tzinfo=timezone.utc),
+    "point": _Point(1, 2),
+    "b": [1, 2.5, None, True],
+    "a": {"z": 1, "y": 2},
+}
+
+
+@pytest.fixture()
+def json_app():
+    app = Flask(__name__)
+    setup_json_provider(app)
+
+    @app.route("/echo", methods=["POST"])
+    def echo():
+        return jsonify(request.get_json())
+
+    @app.route("/sample")
+    def sample():
+        return jsonify(_SAMPLE)
+
+    return app
+
+
+@pytest.mark.unit
+def test_setup_installs_orjson_provider(json_app):
+    assert isinstance(json_app.json, OrjsonJSONProvider)
+
+
+@pytest.mark.unit
+def test_dumps_matches_default_provider(json_app):
+    default = DefaultJSONProvider(json_app)
+
+    ours = json_app.json.dumps(_SAMPLE)
+    theirs = default.dumps(_SAMPLE)
+
+    assert json.loads(ours) == json.loads(theirs)
+    # ключи отсортированы, как у DefaultJSONProvider
+    assert list(json.loads(ours)) == sorted(_SAMPLE)
+    # даты — в формате HTTP-date (как у Flask), а не ISO
+    assert json.loads(ours)["as_of"] == "Fri, 31 Jan 2025 00:00:00 GMT"
+
+
+@pytest.mark.unit
+def test_dumps_falls_back_for_big_ints(json_app):
+    big = 2**70
+    assert json.loads(json_app.json.dumps({"n": big})) == {"n": big}
+
+
+@pytest.mark.unit
+def test_jsonify_and_get_json_roundtrip(json_app):
+    client = json_app.test_client()
+
+    r = client.post("/echo", json={"files": ["прайс.xlsx"], "n": 3})
+    assert r.status_code == 200
+    assert r.get_json() == {"files": ["прайс.xlsx"], "n": 3}
+
+    r = client.get("/sample")
+    assert r.get_json()["price"] == "1234.50"
+
+
+@pytest.mark.unit
+def test_loads_stays_on_stdlib(json_app):
+    # входящие тела (request.get_json) разбирает DefaultJSONProvider, не orjson
+    assert OrjsonJSONProvider.loads is DefaultJSONProvider.loads
+
+
+@pytest.mark.unit
+def test_invalid_json_body_is_bad_request(json_app):
+    client = json_app.test_client()
+
+    r = client.post("/echo", data="{not json", content_type="application/json")
+    assert r.status_code == 400
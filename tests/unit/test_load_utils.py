@@ -1,3 +1,4 @@
+import logging
 import os
 import sys
 import uuid
@@ -34,8 +35,16 @@ class DummyCursor:
         self.executed = []
 
     def execute(self, sql, params=None):
+        # execute_batch() склеивает уже отрендеренные mogrify() statements в bytes;
+        # сами statements с параметрами фиксируются в mogrify()
+        if isinstance(sql, bytes):
+            return
         self.executed.append((sql, params))
 
+    def mogrify(self, sql, params=None):
+        self.executed.append((sql, params))
+        return b""
+
     def __enter__(self):
         return self
 
@@ -77,6 +86,19 @@ class DummyConn:
 RUN_DB_TESTS = os.getenv("RUN_DB_TESTS", "0").lower() in ("1", "true", "yes")
 
 
+def _write_xlsx(path, rows):
+    """
+    Пишет xlsx построчно через write_only-книгу: ws.append() сериализует строку целиком,
+    без создания Cell-объектов на каждое присваивание ws["A1"] = ...
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+    wb.close()
+
+
 # =============================================================================
 # Tests for _norm() function
 # =============================================================================
@@ -128,53 +150,25 @@ def test_norm_collapses_multiple_spaces():
 
 
 @pytest.mark.unit
-def test_to_float_converts_string_to_float():
-    """
-    Test: _to_float() should convert string "1000" to 1000.0
-    """
-    input_string = "1000"
-    result = _to_float(input_string)
-    assert result == 1000.0
-
-
-@pytest.mark.unit
-def test_to_float_handles_spaces_in_numbers():
-    """
-    Test: _to_float() should handle "1 000" (with spaces).
-    """
-    input_string = "1 000"
-    result = _to_float(input_string)
-    assert result == 1000.0
-
-
-@pytest.mark.unit
-def test_to_float_handles_comma_as_decimal_separator():
-    """
-    Test: _to_float() should convert "1000,50" to 1000.5
-    """
-    input_string = "1000,50"
-    result = _to_float(input_string)
-    assert result == 1000.5
-
-
-@pytest.mark.unit
-def test_to_float_handles_none():
-    """
-    Test: _to_float(None) should return None.
-    """
-    input_value = None
-    result = _to_float(input_value)
-    assert result is None
-
-
-@pytest.mark.unit
-def test_to_float_handles_negative_numbers():
+@pytest.mark.parametrize(
+    "inp,expected",
+    [
+        ("1000", 1000.0),  # обычная строка
+        ("1 000", 1000.0),  # пробелы-разделители разрядов
+        ("1000,50", 1000.5),  # запятая как десятичный разделитель
+        (None, None),
+        ("-42.5", -42.5),  # отрицательные числа
+        ("1\xa0000,50 руб.", 1000.5),  # неразрывный пробел + хвост с валютой
+        (1500, 1500.0),  # числовые ячейки — без разбора строки
+        (1e20, 1e20),
+        (float("nan"), None),
+    ],
+)
+def test_to_float(inp, expected):
     """
-    Test: _to_float() should handle negative numbers.
+    Test: _to_float() parses price-like strings and returns None for None.
     """
-    input_string = "-42.5"
-    result = _to_float(input_string)
-    assert result == -42.5
+    assert _to_float(inp) == expected
 
 
 # =============================================================================
@@ -183,33 +177,19 @@ def test_to_float_handles_negative_numbers():
 
 
 @pytest.mark.unit
-def test_to_int_converts_string_to_int():
-    """
-    Test: _to_int() should convert "42" to 42.
-    """
-    input_string = "42"
-    result = _to_int(input_string)
-    assert result == 42
-
-
-@pytest.mark.unit
-def test_to_int_rounds_float_to_int():
-    """
-    Test: _to_int() should round "42.7" to 43.
-    """
-    input_string = "42.7"
-    result = _to_int(input_string)
-    assert result == 43
-
-
-@pytest.mark.unit
-def test_to_int_handles_none():
+@pytest.mark.parametrize(
+    "inp,expected",
+    [
+        ("42", 42),
+        ("42.7", 43),  # округление, а не отбрасывание дробной части
+        (None, None),
+    ],
+)
+def test_to_int(inp, expected):
     """
-    Test: _to_int(None) should return None.
+    Test: _to_int() converts to int with rounding and returns None for None.
     """
-    input_value = None
-    result = _to_int(input_value)
-    assert result is None
+    assert _to_int(inp) == expected
 
 
 # =============================================================================
@@ -218,63 +198,82 @@ def test_to_int_handles_none():
 
 
 @pytest.mark.unit
-def test_norm_key_converts_to_lowercase():
+@pytest.mark.parametrize(
+    "inp,expected",
+    [
+        ("ЦЕНА", "цена"),  # нижний регистр
+        ("Цена прайс", "цена_прайс"),  # пробелы -> подчёркивания
+        ("объём", "объем"),  # ё -> е
+        ("Алк, %", "алк"),  # спецсимволы, включая %
+        ("Цена, руб.", "цена_руб"),  # запятые, точки
+        ("Цена___прайс", "цена_прайс"),  # схлопывание подчёркиваний
+    ],
+)
+def test_norm_key(inp, expected):
     """
-    Test: _norm_key() should convert to lowercase.
+    Test: _norm_key() builds a lowercase snake_case key from a header cell.
     """
-    input_string = "ЦЕНА"
-    result = _norm_key(input_string)
-    assert result == "цена"
+    assert _norm_key(inp) == expected
 
 
-@pytest.mark.unit
-def test_norm_key_replaces_spaces_with_underscores():
-    """
-    Test: _norm_key() should replace spaces with underscores.
-    """
-    input_string = "Цена прайс"
-    result = _norm_key(input_string)
-    assert result == "цена_прайс"
+def _norm_key_reference(s):
+    """Прежняя многопроходная реализация _norm_key() — эталон для сравнения."""
+    import re
 
-
-@pytest.mark.unit
-def test_norm_key_replaces_yo_with_ye():
-    """
-    Test: _norm_key() should replace 'ё' with 'е'.
-    """
-    input_string = "объём"
-    result = _norm_key(input_string)
-    assert result == "объем"
-
-
-@pytest.mark.unit
-def test_norm_key_handles_percent_sign():
-    """
-    Test: _norm_key() removes special characters including percent sign.
-    """
-    input_string = "Алк, %"
-    result = _norm_key(input_string)
-    assert result == "алк"
+    s = _norm(s).lower()
+    s = s.replace("ё", "е")
+    s = s.replace("%", " % ")
+    s = re.sub(r"\s+", "_", s)
+    s = re.sub(r"[^a-z0-9а-я_]+", "_", s)
+    s = re.sub(r"_+", "_", s).strip("_")
+    s = s.replace("алк__", "алк_").replace("емк__л", "емк_л")
+    s = re.sub(r"(цена_со_скидкой)(_?\d+_?)?$", "цена_со_скидкой", s)
+    return s
 
 
 @pytest.mark.unit
-def test_norm_key_removes_special_characters():
+@pytest.mark.parametrize(
+    "inp",
+    [
+        "Код",
+        " Цена со скидкой 10% ",
+        "Цена со скидкой\n0%",
+        "Алк, %",
+        "Емк., л",
+        "Бут. в кор.",
+        "ЁМКОСТЬ",
+        "Unnamed: 3",
+        "__price__RUB__",
+        "Сайт производителя (www)",
+        "Цена\tпрайс\r\n",
+        "Vivino",
+        "",
+        None,
+        42,
+    ],
+)
+def test_norm_key_matches_reference_implementation(inp):
     """
-    Test: _norm_key() should remove special characters (commas, dots, etc).
+    Test: precompiled _norm_key() returns exactly what the old multi-pass version did.
     """
-    input_string = "Цена, руб."
-    result = _norm_key(input_string)
-    assert result == "цена_руб"
+    assert _norm_key(inp) == _norm_key_reference(inp)
 
 
 @pytest.mark.unit
-def test_norm_key_collapses_multiple_underscores():
+@pytest.mark.parametrize(
+    "inp,expected",
+    [
+        ("Ｃｏｄｅ", "code"),  # полноширинные символы (NFKC)
+        ("Объе\u0308м", "объем"),  # «ё» в разложенной форме
+        ("ЁМКОСТЬ, Л", "емкость_л"),
+        ("Straße", "strasse"),  # casefold
+    ],
+)
+def test_norm_key_unicode_normalization(inp, expected):
     """
-    Test: _norm_key() should collapse multiple underscores into one.
+    Test: _norm_key() applies NFKC + casefold to non-ASCII headers.
     """
-    input_string = "Цена___прайс"
-    result = _norm_key(input_string)
-    assert result == "цена_прайс"
+    assert _norm_key(inp) == expected
 
 
 # =============================================================================
@@ -282,6 +281,30 @@ def test_norm_key_collapses_multiple_underscores():
 # =============================================================================
 
 
+@pytest.fixture(scope="module")
+def discount_files(tmp_path_factory):
+    """
+    Набор Excel-файлов со значением скидки в S5, собранный один раз на модуль.
+
+    Ключ — значение, записанное в S5 (None — ячейку не трогаем).
+    """
+    base = tmp_path_factory.mktemp("discount")
+    files = {}
+    for name, value in (
+        ("percent", "10%"),
+        ("decimal", 0.15),
+        ("large", 10),
+        ("empty", None),
+        ("invalid", "invalid"),
+    ):
+        excel_file = base / f"test_discount_{name}.xlsx"
+        # S5: 4 пустые строки, затем 18 пустых колонок (A..R) перед S
+        rows = [[]] * 4 + ([[None] * 18 + [value]] if value is not None else [])
+        _write_xlsx(excel_file, rows)
+        files[value] = str(excel_file)
+    return files
+
+
 class TestGetDiscountFromCell:
     """
     Тесты для извлечения скидки из ячейки Excel.
@@ -291,72 +314,43 @@ class TestGetDiscountFromCell:
     """
 
     @pytest.mark.unit
-    def test_discount_percentage_format(self, tmp_path):
+    def test_discount_percentage_format(self, discount_files):
         """
         Test: Скидка в формате "10%" должна преобразоваться в 0.10
         """
-        wb = Workbook()
-        ws = wb.active
-        ws["S5"] = "10%"
-        excel_file = tmp_path / "test_discount.xlsx"
-        wb.save(excel_file)
-
-        result = _get_discount_from_cell(str(excel_file), 0, "S5")
+        result = _get_discount_from_cell(discount_files["10%"], 0, "S5")
         assert result == 0.10
 
     @pytest.mark.unit
-    def test_discount_decimal_format(self, tmp_path):
+    def test_discount_decimal_format(self, discount_files):
         """
         Test: Скидка в формате 0.15 (десятичная дробь) должна остаться 0.15
         """
-        wb = Workbook()
-        ws = wb.active
-        ws["S5"] = 0.15
-        excel_file = tmp_path / "test_discount_decimal.xlsx"
-        wb.save(excel_file)
-
-        result = _get_discount_from_cell(str(excel_file), 0, "S5")
+        result = _get_discount_from_cell(discount_files[0.15], 0, "S5")
         assert result == 0.15
 
     @pytest.mark.unit
-    def test_discount_large_number_format(self, tmp_path):
+    def test_discount_large_number_format(self, discount_files):
         """
         Test: Скидка 10 (число > 1) должна преобразоваться в 0.10
         """
-        wb = Workbook()
-        ws = wb.active
-        ws["S5"] = 10
-        excel_file = tmp_path / "test_discount_large.xlsx"
-        wb.save(excel_file)
-
-        result = _get_discount_from_cell(str(excel_file), 0, "S5")
+        result = _get_discount_from_cell(discount_files[10], 0, "S5")
         assert result == 0.10
 
     @pytest.mark.unit
-    def test_discount_empty_cell(self, tmp_path):
+    def test_discount_empty_cell(self, discount_files):
         """
         Test: Пустая ячейка S5 должна возвращать None
         """
-        wb = Workbook()
-        wb.active  # S5 не трогаем
-        excel_file = tmp_path / "test_discount_empty.xlsx"
-        wb.save(excel_file)
-
-        result = _get_discount_from_cell(str(excel_file), 0, "S5")
+        result = _get_discount_from_cell(discount_files[None], 0, "S5")
         assert result is None
 
     @pytest.mark.unit
-    def test_discount_invalid_format(self, tmp_path):
+    def test_discount_invalid_format(self, discount_files):
         """
         Test: Некорректный формат ("invalid") должен возвращать None
         """
-        wb = Workbook()
-        ws = wb.active
-        ws["S5"] = "invalid"
-        excel_file = tmp_path / "test_discount_invalid.xlsx"
-        wb.save(excel_file)
-
-        result = _get_discount_from_cell(str(excel_file), 0, "S5")
+        result = _get_discount_from_cell(discount_files["invalid"], 0, "S5")
         assert result is None
 
 
@@ -406,6 +400,44 @@ class TestCanonicalizeHeaders:
         assert result["Тип"] == "style"
         assert result["Цвет"] == "color"
 
+    @pytest.mark.unit
+    def test_canonicalize_headers_is_cached_and_read_only(self):
+        cols = ["Код", "Цена прайс"]
+        first = _canonicalize_headers(cols)
+        second = _canonicalize_headers(tuple(cols))
+
+        assert first is second
+        with pytest.raises(TypeError):
+            first["Код"] = "price_rub"
+
+
+@pytest.fixture(scope="module")
+def read_any_files(tmp_path_factory):
+    """Входные файлы для TestReadAny, создаются один раз на модуль."""
+    base = tmp_path_factory.mktemp("read_any")
+
+    # CSV с русскими символами в cp1251
+    csv_file = base / "test_encoding.csv"
+    csv_content = "Код,Название,Цена\n123,Тестовое вино,1000\n456,Другое вино,2000"
+    csv_file.write_bytes(csv_content.encode("cp1251"))
+
+    # CSV в utf-8 с BOM: BOM не должен попасть в имя первой колонки
+    bom_file = base / "test_bom.csv"
+    bom_file.write_bytes(("Код;Название;Цена\n789;Вино с BOM;1500\n").encode("utf-8-sig"))
+
+    basic_file = base / "test_basic.xlsx"
+    _write_xlsx(basic_file, [["Код", "Название", "Цена"], ["123", "Вино", "1000"]])
+
+    article_file = base / "test_article.xlsx"
+    _write_xlsx(article_file, [["Артикул", "Название"], ["WINE123", "Красное вино"]])
+
+    return {
+        "csv_cp1251": str(csv_file),
+        "csv_utf8_bom": str(bom_file),
+        "excel_basic": str(basic_file),
+        "excel_article": str(article_file),
+    }
+
 
 class TestReadAny:
     """
@@ -413,33 +445,38 @@ class TestReadAny:
     """
 
     @pytest.mark.unit
-    def test_read_any_detects_csv_encoding(self, tmp_path):
-        # CSV с русскими символами в cp1251
-        csv_file = tmp_path / "test_encoding.csv"
-        csv_content = "Код,Название,Цена\n123,Тестовое вино,1000\n456,Другое вино,2000"
-        csv_file.write_bytes(csv_content.encode("cp1251"))
-
-        df = read_any(str(csv_file))
+    def test_read_any_detects_csv_encoding(self, read_any_files):
+        df = read_any(read_any_files["csv_cp1251"])
 
         assert "code" in df.columns
         assert len(df) == 2
         assert df.iloc[0]["code"] == "123"
 
     @pytest.mark.unit
-    def test_read_any_handles_excel_basic(self, tmp_path):
-        wb = Workbook()
-        ws = wb.active
-        ws["A1"] = "Код"
-        ws["B1"] = "Название"
-        ws["C1"] = "Цена"
-        ws["A2"] = "123"
-        ws["B2"] = "Вино"
-        ws["C2"] = "1000"
+    def test_read_any_strips_utf8_bom_from_csv_header(self, read_any_files):
+        df = read_any(read_any_files["csv_utf8_bom"])
+
+        assert "code" in df.columns
+        assert df.iloc[0]["code"] == "789"
+        assert df.iloc[0]["title_ru"] == "Вино с BOM"
+
+    @pytest.mark.unit
+    def test_read_any_utf8_char_split_at_sniff_boundary(self, tmp_path):
+        # кириллица в utf-8 — 2 байта; ставим символ ровно на границу буфера детекта
+        header = "Код,Название\n".encode("utf-8")
+        filler = b"1," + b"a" * (load_utils.CSV_SNIFF_BYTES - len(header) - 3)
+        body = header + filler + "Ж\n".encode("utf-8") + "2,Вино\n".encode("utf-8")
+        assert body[load_utils.CSV_SNIFF_BYTES - 1 : load_utils.CSV_SNIFF_BYTES + 1] == "Ж".encode("utf-8")
+        csv_file = tmp_path / "boundary.csv"
+        csv_file.write_bytes(body)
 
-        excel_file = tmp_path / "test_basic.xlsx"
-        wb.save(excel_file)
+        df = read_any(str(csv_file))
 
-        df = read_any(str(excel_file))
+        assert df.iloc[1]["title_ru"] == "Вино"
+
+    @pytest.mark.unit
+    def test_read_any_handles_excel_basic(self, read_any_files):
+        df = read_any(read_any_files["excel_basic"])
 
         assert "code" in df.columns
         assert "title_ru" in df.columns
@@ -448,18 +485,8 @@ class TestReadAny:
         assert df.iloc[0]["code"] == "123"
 
     @pytest.mark.unit
-    def test_read_any_finds_code_column(self, tmp_path):
-        wb = Workbook()
-        ws = wb.active
-        ws["A1"] = "Артикул"
-        ws["B1"] = "Название"
-        ws["A2"] = "WINE123"
-        ws["B2"] = "Красное вино"
-
-        excel_file = tmp_path / "test_article.xlsx"
-        wb.save(excel_file)
-
-        df = read_any(str(excel_file))
+    def test_read_any_finds_code_column(self, read_any_files):
+        df = read_any(read_any_files["excel_article"])
 
         assert "code" in df.columns
         assert df.iloc[0]["code"] == "WINE123"
@@ -508,6 +535,32 @@ def test_upsert_records_prefers_attr_over_env(monkeypatch):
     assert pytest.approx(params["price_rub"], rel=1e-6) == 80.0
 
 
+@pytest.mark.unit
+def test_upsert_records_failed_page_logs_its_codes(monkeypatch, caplog):
+    """
+    При ошибке батча в лог попадают диапазон строк и первый/последний code
+    упавшей страницы — иначе плохую строку в прайсе не найти.
+    """
+    class FailingCursor(DummyCursor):
+        def mogrify(self, sql, params=None):
+            if "INSERT INTO products" in sql and params["code"] == "C4":
+                raise ValueError("bad row")
+            return super().mogrify(sql, params)
+
+    dummy_conn = DummyConn()
+    dummy_conn.cursor_obj = FailingCursor()
+    monkeypatch.setattr(load_utils, "get_conn", lambda: dummy_conn)
+    monkeypatch.setattr(load_utils, "UPSERT_PAGE_SIZE", 2)
+
+    df = pd.DataFrame([{"code": f"C{i}", "price_rub": 100.0} for i in range(1, 6)])
+
+    with caplog.at_level(logging.ERROR, logger=load_utils.__name__), pytest.raises(ValueError):
+        upsert_records(df, date.today())
+
+    assert "products upsert failed: rows 3..4 of 5, codes C3..C4" in caplog.text
+    assert not dummy_conn.committed
+
+
 @pytest.mark.unit
 def test_upsert_records_uses_env_when_attr_missing(monkeypatch):
     """
@@ -604,18 +657,11 @@ def test_upsert_records_insert_and_update(monkeypatch):
     # Уникальный код для этого теста, чтобы не конфликтовать со старыми данными
     code = f"INTTEST_UPSERT_{uuid.uuid4().hex[:8]}"
 
-    # DataFrame вместо списка словарей
-    df = pd.DataFrame(
-        [
-            {
-                "code": code,
-                "envelope_id": test_uuid,
-                "price_rub": 100.0,
-                "price_discount": 90.0,
-                "price_final_rub": 90.0,
-            }
-        ]
-    )
+    # DataFrame из кортежа с явными колонками — без вывода схемы из словарей
+    df = pd.DataFrame.from_records(
+        [(code, test_uuid, 100.0, 90.0, 90.0)],
+        columns=["code", "envelope_id", "price_rub", "price_discount", "price_final_rub"],
+    ).astype({"price_rub": "float64", "price_discount": "float64", "price_final_rub": "float64"})
 
     today = date.today()
 
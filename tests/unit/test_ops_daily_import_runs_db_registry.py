@@ -1,19 +1,66 @@
 import json
 from datetime import datetime, timezone
+from types import MappingProxyType
 
 import pytest
 from flask import Flask, jsonify, request
 
-
-@pytest.fixture()
-def ops_client(tmp_path, monkeypatch):
+# Canned DB rows: built and frozen once per module; the endpoints only read them,
+# so db_query() hands out the same read-only objects on every call.
+_RUN_ROW_1 = MappingProxyType({
+    "run_id": "11111111-1111-1111-1111-111111111111",
+    "status": "OK",
+    "requested_mode": "auto",
+    "selected_mode": "AUTO_LATEST",
+    "started_at": datetime(2026, 1, 1, tzinfo=timezone.utc),
+    "finished_at": datetime(2026, 1, 1, tzinfo=timezone.utc),
+    "duration_ms": 1000,
+    "summary": {"files_total": 1, "files_imported": 1,
+                "files_skipped": 0, "files_quarantined": 0,
+                "files_failed": 0}})
+_RUN_ROW_2 = MappingProxyType({
+    "run_id": "22222222-2222-2222-2222-222222222222",
+    "status": "OK",
+    "requested_mode": "auto",
+    "selected_mode": "AUTO_LATEST",
+    "started_at": datetime(2025, 12, 31, tzinfo=timezone.utc),
+    "finished_at": datetime(2025, 12, 31, tzinfo=timezone.utc),
+    "duration_ms": 900,
+    "summary": {"files_total": 1, "files_imported": 1,
+                "files_skipped": 0, "files_quarantined": 0,
+                "files_failed": 0}})
+# extra row => next_cursor should exist for limit=2
+_RUN_ROW_3 = MappingProxyType({
+    "run_id": "33333333-3333-3333-3333-333333333333",
+    "status": "FAILED",
+    "requested_mode": "files",
+    "selected_mode": "MANUAL_LIST",
+    "started_at": datetime(2025, 12, 30, tzinfo=timezone.utc),
+    "finished_at": datetime(2025, 12, 30, tzinfo=timezone.utc),
+    "duration_ms": 800,
+    "summary": {"files_total": 1, "files_imported": 0,
+                "files_skipped": 0, "files_quarantined": 0,
+                "files_failed": 1}})
+
+_LIST_ROWS = (_RUN_ROW_1, _RUN_ROW_2, _RUN_ROW_3)
+
+_DETAIL_ROWS = (MappingProxyType({
+    "run_id": "33333333-3333-3333-3333-333333333333",
+    "status": "FAILED",
+    "result_json": {
+        "run_id": "33333333-3333-3333-3333-333333333333",
+        "status": "FAILED"},
+}),)
+
+# list: limit+1 rows; detail: single row by run_id
+RESPONSES = MappingProxyType({"list": _LIST_ROWS, "detail": _DETAIL_ROWS, "empty": ()})
+
+
+@pytest.fixture(scope="module")
+def ops_app():
+    """Flask app + ops endpoints, built once per module (state is reset per test)."""
     from api import ops_daily_import as mod
 
-    # isolate FS
-    logs = tmp_path / "logs"
-    logs.mkdir()
-    monkeypatch.setattr(mod, "LOGS_DIR", logs)
-
     app = Flask(__name__)
 
     # minimal API-key gate
@@ -36,54 +83,27 @@ def ops_client(tmp_path, monkeypatch):
         return DummyConn(), None
 
     def db_query(conn, sql, params=()):
-        if "FROM public.ops_daily_import_runs" in sql and "WHERE run_id" not in sql:
-            # list: return limit+1 rows
-            return [
-                {"run_id": "11111111-1111-1111-1111-111111111111",
-                 "status": "OK",
-                 "requested_mode": "auto",
-                 "selected_mode": "AUTO_LATEST",
-                 "started_at": datetime(2026, 1, 1, tzinfo=timezone.utc),
-                 "finished_at": datetime(2026, 1, 1, tzinfo=timezone.utc),
-                 "duration_ms": 1000,
-                 "summary": {"files_total": 1, "files_imported": 1,
-                             "files_skipped": 0, "files_quarantined": 0,
-                             "files_failed": 0}},
-                {"run_id": "22222222-2222-2222-2222-222222222222",
-                 "status": "OK",
-                 "requested_mode": "auto",
-                 "selected_mode": "AUTO_LATEST",
-                 "started_at": datetime(2025, 12, 31, tzinfo=timezone.utc),
-                 "finished_at": datetime(2025, 12, 31, tzinfo=timezone.utc),
-                 "duration_ms": 900,
-                 "summary": {"files_total": 1, "files_imported": 1,
-                             "files_skipped": 0, "files_quarantined": 0,
-                             "files_failed": 0}},
-                # extra row => next_cursor should exist for limit=2
-                {"run_id": "33333333-3333-3333-3333-333333333333",
-                 "status": "FAILED",
-                 "requested_mode": "files",
-                 "selected_mode": "MANUAL_LIST",
-                 "started_at": datetime(2025, 12, 30, tzinfo=timezone.utc),
-                 "finished_at": datetime(2025, 12, 30, tzinfo=timezone.utc),
-                 "duration_ms": 800,
-                 "summary": {"files_total": 1, "files_imported": 0,
-                             "files_skipped": 0, "files_quarantined": 0,
-                             "files_failed": 1}},
-            ]
-
-        if "FROM public.ops_daily_import_runs" in sql and "WHERE run_id" in sql:
-            return [{
-                "run_id": "33333333-3333-3333-3333-333333333333",
-                "status": "FAILED",
-                "result_json": {
-                    "run_id": "33333333-3333-3333-3333-333333333333",
-                    "status": "FAILED"},
-            }]
-
-        return []
+        if "FROM public.ops_daily_import_runs" not in sql:
+            return RESPONSES["empty"]
+        return RESPONSES["detail" if "WHERE run_id" in sql else "list"]
 
     mod.register_ops_daily_import(app, require_api_key, db_connect, db_query)
+    return app, state
+
+
+@pytest.fixture()
+def ops_client(ops_app, tmp_path, monkeypatch):
+    from api import ops_daily_import as mod
+
+    app, state = ops_app
+    state["db_mode"] = "ok"
+    state["calls"] = 0
+
+    # isolate FS (LOGS_DIR is read per request, so per-test patching is enough)
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    monkeypatch.setattr(mod, "LOGS_DIR", logs)
+
     return app.test_client(), state, logs
 
 def test_runs_list_db_contract_and_next_cursor(ops_client):
@@ -101,6 +121,21 @@ def test_runs_list_db_contract_and_next_cursor(ops_client):
     assert "runs" in data
     assert len(data["runs"]) == 2
 
+@pytest.mark.parametrize(
+    "status, code",
+    [("failed", 200), ("OK", 200), ("1BAD", 400), ("FAIL ED", 400), ("X" * 41, 400)],
+)
+def test_runs_list_validates_status_filter(ops_client, status, code):
+    client, _state, _ = ops_client
+    r = client.get(
+        "/api/v1/ops/daily-import/runs",
+        query_string={"status": status},
+        headers={"X-API-Key": "testkey"},
+    )
+    assert r.status_code == code
+    if code == 400:
+        assert r.get_json() == {"error": "Invalid status filter"}
+
 def test_run_detail_db_first(ops_client):
     client, state, _ = ops_client
     # first call warms state["calls"] for the stub; second call returns run_log
@@ -130,3 +165,83 @@ def test_runs_list_fs_fallback_when_db_down(ops_client):
     assert r.status_code == 200
     data = r.get_json()
     assert data["runs"][0]["run_id"].startswith("aaaaaaaa")
+
+def test_run_detail_fs_fallback_partial_log_reports_running(ops_client):
+    client, state, logs = ops_client
+    state["db_mode"] = "down"
+
+    # log is being rewritten: truncated JSON must not surface as 500
+    (logs / "bbbbbbbb-bbbb-bbbb-bbbb-bbbbbbbbbbbb.json").write_bytes(b'{"run_id": "bbbb')
+
+    r = client.get("/api/v1/ops/daily-import/runs/bbbbbbbb-bbbb-bbbb-bbbb-bbbbbbbbbbbb",
+                   headers={"X-API-Key":"testkey"})
+    assert r.status_code == 200
+    data = r.get_json()
+    assert data["status"] == "RUNNING"
+    assert data["run_id"].startswith("bbbbbbbb")
+
+
+def test_runs_list_fs_fallback_picks_up_rewritten_log(ops_client):
+    client, state, logs = ops_client
+    state["db_mode"] = "down"
+
+    log = logs / "cccccccc-cccc-cccc-cccc-cccccccccccc.json"
+    log.write_text(json.dumps({
+        "run_id": "cccccccc-cccc-cccc-cccc-cccccccccccc",
+        "status": "RUNNING",
+        "started_at": "2026-01-02T00:00:00+00:00",
+    }), encoding="utf-8")
+
+    r = client.get("/api/v1/ops/daily-import/runs?limit=50", headers={"X-API-Key":"testkey"})
+    assert r.get_json()["runs"][0]["status"] == "RUNNING"
+
+    # the orchestrator rewrites the log on finish: cached parse must be invalidated
+    log.write_text(json.dumps({
+        "run_id": "cccccccc-cccc-cccc-cccc-cccccccccccc",
+        "status": "OK",
+        "started_at": "2026-01-02T00:00:00+00:00",
+        "finished_at": "2026-01-02T00:00:05+00:00",
+        "duration_ms": 5000,
+    }), encoding="utf-8")
+
+    r = client.get("/api/v1/ops/daily-import/runs?limit=50", headers={"X-API-Key":"testkey"})
+    assert r.status_code == 200
+    assert r.get_json()["runs"][0]["status"] == "OK"
+
+
+
+def _write_run_logs(logs_dir, n, prefix):
+    for i in range(n):
+        run_id = f"{prefix}{i:06d}-0000-0000-0000-000000000000"
+        (logs_dir / f"{run_id}.json").write_text(json.dumps({
+            "run_id": run_id,
+            "status": "OK",
+            "started_at": "2026-01-02T00:00:00+00:00",
+        }), encoding="utf-8")
+
+
+
+def test_iter_run_logs_concurrent_scans_of_different_dirs(tmp_path):
+    """
+    gunicorn --threads: кэш разобранных логов общий для всех потоков.
+    Скан одного каталога чистит записи другого, пока тот их добавляет —
+    каждый скан всё равно должен отдать все свои логи, без исключений.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from api import ops_daily_import as mod
+
+    dirs = []
+    for k in range(4):
+        d = tmp_path / f"logs-{k}"
+        d.mkdir()
+        _write_run_logs(d, 20, f"{k:02d}")
+        dirs.append(d)
+
+    def scan(d):
+        return [sum(1 for _, _, data in mod._iter_run_logs(d) if data) for _ in range(25)]
+
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        counts = [c for batch in ex.map(scan, dirs * 2) for c in batch]
+
+    assert set(counts) == {20}
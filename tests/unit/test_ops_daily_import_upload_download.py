@@ -1,85 +1,137 @@
 import hashlib
+import importlib
 import io
+import itertools
 import os
+import shutil
+import tempfile
 import uuid
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
+from types import MappingProxyType
 
 import pytest
 from flask import Flask, jsonify, request
 from werkzeug.datastructures import MultiDict
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request as WerkzeugRequest
+
+from api.json_provider import setup_json_provider
+
+# Эталонные payload'ы и их sha256 — считаем один раз при импорте модуля
+_PAYLOAD_SAME = b"same-content"
+_SHA_SAME = hashlib.sha256(_PAYLOAD_SAME).hexdigest()
+_PAYLOAD_BX10 = b"b" * 10
+_SHA_BX10 = hashlib.sha256(_PAYLOAD_BX10).hexdigest()
+
+# Готовое multipart-тело для «много файлов»: без повторного кодирования в test client
+_BOUNDARY = "wine-ops-test-boundary"
+_FILES_PART = (
+    b"--" + _BOUNDARY.encode() + b"\r\n"
+    b'Content-Disposition: form-data; name="files"; filename="f%d.xlsx"\r\n'
+    b"Content-Type: application/octet-stream\r\n\r\n"
+    b"x\r\n"
+)
 
 
-@pytest.fixture()
-def ops_client(tmp_path, monkeypatch):
-    """
-    Изолированный Flask app + ops endpoints с замонкейпатченными директориями.
+@lru_cache(maxsize=None)
+def _multipart_files_body(n: int) -> bytes:
+    return b"".join(_FILES_PART % i for i in range(n)) + b"--" + _BOUNDARY.encode() + b"--\r\n"
 
-    ВАЖНО: monkeypatch делаем на уровне модуля api.ops_daily_import:
-      - INBOX_DIR, ARCHIVE_DIR, QUARANTINE_DIR, LOGS_DIR
-    чтобы тесты НЕ трогали реальные data/* директории проекта.
-    """
-    from api import ops_daily_import as mod
 
-    inbox = tmp_path / "inbox"
-    archive = tmp_path / "archive"
-    quarantine = tmp_path / "quarantine"
-    logs = tmp_path / "logs"
+@lru_cache(maxsize=32)
+def _norm_sql(sql: str) -> str:
+    # SQL в api.ops_daily_import — литералы, так что нормализуем каждый один раз
+    return " ".join(sql.split()).lower()
 
-    inbox.mkdir(parents=True, exist_ok=True)
-    archive.mkdir(parents=True, exist_ok=True)
-    quarantine.mkdir(parents=True, exist_ok=True)
-    logs.mkdir(parents=True, exist_ok=True)
 
-    monkeypatch.setattr(mod, "INBOX_DIR", inbox)
-    monkeypatch.setattr(mod, "ARCHIVE_DIR", archive)
-    monkeypatch.setattr(mod, "QUARANTINE_DIR", quarantine)
-    monkeypatch.setattr(mod, "LOGS_DIR", logs)
-    monkeypatch.setattr(mod, "OPS_UPLOAD_DEDUPE_POLICY", "reject")
+# минимальный API-key gate (как требует Issue: endpoints защищены X-API-Key)
+def require_api_key(fn):
+    def wrapper(*a, **kw):
+        if request.headers.get("X-API-Key") != "testkey":
+            return jsonify({"error": "forbidden"}), 403
+        return fn(*a, **kw)
+
+    wrapper.__name__ = fn.__name__
+    return wrapper
+
+
+@dataclass
+class _Diag:
+    constraint_name: str
 
-    app = Flask(__name__)
 
-    # минимальный API-key gate (как требует Issue: endpoints защищены X-API-Key)
-    def require_api_key(fn):
-        def wrapper(*a, **kw):
-            if request.headers.get("X-API-Key") != "testkey":
-                return jsonify({"error": "forbidden"}), 403
-            return fn(*a, **kw)
+class FakeUniqueViolation(Exception):
+    def __init__(self, constraint_name: str):
+        super().__init__(
+            f"duplicate key value violates unique constraint \"{constraint_name}\"")
+        self.pgcode = "23505"
+        self.diag = _Diag(constraint_name=constraint_name)
 
-        wrapper.__name__ = fn.__name__
-        return wrapper
 
-    @dataclass
-    class _Diag:
-        constraint_name: str
+class FakeConn:
+    def __init__(self):
+        self.closed = False
 
-    class FakeUniqueViolation(Exception):
-        def __init__(self, constraint_name: str):
-            super().__init__(
-                f"duplicate key value violates unique constraint \"{constraint_name}\"")
-            self.pgcode = "23505"
-            self.diag = _Diag(constraint_name=constraint_name)
+    def commit(self): pass
 
-    class FakeConn:
-        def __init__(self):
-            self.closed = False
+    def rollback(self): pass
 
-        def commit(self): pass
+    def close(self): self.closed = True
 
-        def rollback(self): pass
 
-        def close(self): self.closed = True
+@pytest.fixture(scope="session")
+def _ops_mod():
+    """Модуль api.ops_daily_import — импортируем один раз на сессию."""
+    return importlib.import_module("api.ops_daily_import")
+
+
+@pytest.fixture(scope="session")
+def _ops_tmp_root(tmp_path_factory):
+    """
+    Корень для файлов upload/download тестов: tmpfs (/dev/shm), если доступен,
+    иначе обычный basetemp pytest (например, на Windows).
+    """
+    shm = Path("/dev/shm")
+    if shm.is_dir() and os.access(shm, os.W_OK):
+        root = Path(tempfile.mkdtemp(prefix="pytest-wine-ops-", dir=shm))
+        yield root
+        shutil.rmtree(root, ignore_errors=True)
+    else:
+        yield tmp_path_factory.mktemp("ops")
+
+
+@pytest.fixture(scope="module")
+def _ops_app(_ops_mod):
+    """
+    Flask app + ops endpoints, один на модуль: маршруты регистрируем один раз.
+
+    Эндпоинты читают INBOX_DIR/ARCHIVE_DIR/... из модуля на каждом запросе,
+    поэтому директории подменяются per-test в ops_client, а in-memory «таблицы»
+    фейковой БД там же очищаются.
+    """
+    app = Flask(__name__)
+    # тот же JSON-провайдер и лимит тела, что в api/app.py
+    setup_json_provider(app)
+    app.config["MAX_CONTENT_LENGTH"] = _ops_mod.MAX_UPLOAD_TOTAL_BYTES
 
     # in-memory "table" for ops_daily_import_uploads (only what we need)
     uploads = []  # list[dict]
+    # индексы по строкам со status='INBOX' — как partial unique индексы в БД
+    inbox_by_sha = {}  # dict[str, dict]
+    inbox_by_name = {}  # dict[str, dict]
     # in-memory "table" for ingest_envelope (sha256 -> envelope_id)
     ingest = {}  # dict[str, str]
 
+    # upload_id в тестах только сравниваются на равенство — хватает счётчика
+    upload_ids = itertools.count(1)
+
     def db_connect():
         return FakeConn(), None
 
     def db_query(conn, sql, params=()):
-        q = " ".join(sql.split()).lower()
+        q = _norm_sql(sql)
 
         # SELECT envelope_id FROM public.ingest_envelope WHERE file_sha256=%s LIMIT 1
         if "from public.ingest_envelope" in q and "where file_sha256 = %s" in q:
@@ -92,61 +144,97 @@ def ops_client(tmp_path, monkeypatch):
             original_name, saved_name, sha256, size_bytes, metadata_json = params
 
             # emulate partial unique: sha256 unique where status='INBOX'
-            for r in uploads:
-                if r["status"] == "INBOX" and r["sha256"] == sha256:
-                    return []  # DO NOTHING
+            if sha256 in inbox_by_sha:
+                return []  # DO NOTHING
 
             # emulate partial unique: saved_name unique where status='INBOX'
-            for r in uploads:
-                if r["status"] == "INBOX" and r["saved_name"] == saved_name:
-                    raise FakeUniqueViolation(
-                        "ux_ops_di_uploads_inbox_saved_name")
+            if saved_name in inbox_by_name:
+                raise FakeUniqueViolation(
+                    "ux_ops_di_uploads_inbox_saved_name")
 
-            upload_id = str(uuid.uuid4())
-            uploads.append({
+            upload_id = f"upload-{next(upload_ids):08d}"
+            row = {
                 "upload_id": upload_id,
                 "status": "INBOX",
                 "original_name": original_name,
                 "saved_name": saved_name,
                 "sha256": sha256,
                 "size_bytes": int(size_bytes),
-            })
+                "uploaded_at": None,
+            }
+            uploads.append(row)
+            inbox_by_sha[sha256] = row
+            inbox_by_name[saved_name] = row
             return [{"upload_id": upload_id}]
 
         # SELECT ... WHERE status='INBOX' AND sha256=%s LIMIT 1
         if "from public.ops_daily_import_uploads" in q and "where status = 'inbox' and sha256 = %s" in q:
             (sha256,) = params
-            for r in uploads:
-                if r["status"] == "INBOX" and r["sha256"] == sha256:
-                    # return minimal columns used by code
-                    return [{
-                        "upload_id": r["upload_id"],
-                        "saved_name": r["saved_name"],
-                        "original_name": r["original_name"],
-                        "sha256": r["sha256"],
-                        "size_bytes": r["size_bytes"],
-                        "uploaded_at": None,
-                    }]
-            return []
+            r = inbox_by_sha.get(sha256)
+            # код только читает строку — отдаём read-only view без копии
+            return [MappingProxyType(r)] if r is not None else []
 
         # UPDATE ... SET status='DELETED' ... WHERE status='INBOX' AND sha256=%s
         if "update public.ops_daily_import_uploads" in q and "set status='deleted'" in q:
             (sha256,) = params
-            for r in uploads:
-                if r["status"] == "INBOX" and r["sha256"] == sha256:
-                    r["status"] = "DELETED"
+            r = inbox_by_sha.pop(sha256, None)
+            if r is not None:
+                r["status"] = "DELETED"
+                inbox_by_name.pop(r["saved_name"], None)
             return []
 
         return []
 
-    mod.register_ops_daily_import(app, require_api_key, db_connect, db_query)
-    return app.test_client(), mod, {
+    _ops_mod.register_ops_daily_import(app, require_api_key, db_connect, db_query)
+    # cookies/сессии эндпоинты не используют — один test client на все тесты модуля
+    return app.test_client(), {
+        "uploads": uploads,
+        "inbox_by_sha": inbox_by_sha,
+        "inbox_by_name": inbox_by_name,
+        "ingest": ingest,
+    }
+
+
+@pytest.fixture()
+def ops_client(_ops_app, _ops_mod, _ops_tmp_root, monkeypatch):
+    """
+    Изолированный test client для ops endpoints с замонкейпатченными директориями.
+
+    ВАЖНО: monkeypatch делаем на уровне модуля api.ops_daily_import:
+      - INBOX_DIR, ARCHIVE_DIR, QUARANTINE_DIR, LOGS_DIR
+    чтобы тесты НЕ трогали реальные data/* директории проекта.
+    """
+    mod = _ops_mod
+    client, state = _ops_app
+    for table in state.values():
+        table.clear()
+
+    tmp_path = Path(tempfile.mkdtemp(dir=_ops_tmp_root))
+    inbox = tmp_path / "inbox"
+    archive = tmp_path / "archive"
+    quarantine = tmp_path / "quarantine"
+    logs = tmp_path / "logs"
+
+    # tmp_path свежий и уже существует — parents/exist_ok не нужны
+    for d in (inbox, archive, quarantine, logs):
+        os.mkdir(d)
+
+    for name, value in (
+        ("INBOX_DIR", inbox),
+        ("ARCHIVE_DIR", archive),
+        ("QUARANTINE_DIR", quarantine),
+        ("LOGS_DIR", logs),
+        ("OPS_UPLOAD_DEDUPE_POLICY", "reject"),
+    ):
+        monkeypatch.setattr(mod, name, value)
+
+    return client, mod, {
         "inbox": inbox,
         "archive": archive,
         "quarantine": quarantine,
         "logs": logs,
         "state": {
-            "ingest": ingest,
+            "ingest": state["ingest"],
         },
     }
 
@@ -186,6 +274,58 @@ def test_upload_happy_path_saves_file_and_returns_saved_name(ops_client):
     assert any(f.get("name") == "prices.xlsx" for f in inbox_files)
 
 
+def test_upload_streams_sha256_across_chunks(ops_client, monkeypatch):
+    client, mod, dirs = ops_client
+
+    # мелкий чанк → файл пишется и хешируется в несколько проходов цикла
+    monkeypatch.setattr(mod, "UPLOAD_CHUNK_BYTES", 4)
+    payload = b"multi-chunk-xlsx-bytes"
+
+    r = client.post(
+        "/api/v1/ops/daily-import/inbox/upload",
+        headers={"X-API-Key": "testkey"},
+        data={"files": (io.BytesIO(payload), "chunks.xlsx")},
+        content_type="multipart/form-data",
+    )
+
+    assert r.status_code == 200
+    data = r.get_json()
+    assert data["uploaded"][0]["size"] == len(payload)
+    assert data["uploaded"][0]["sha256"] == hashlib.sha256(payload).hexdigest()
+    assert (dirs["inbox"] / "chunks.xlsx").read_bytes() == payload
+    assert not list(dirs["inbox"].glob(".upload-*.tmp"))
+
+
+def test_upload_batch_keeps_input_order_with_parallel_spooling(ops_client, monkeypatch):
+    client, mod, dirs = ops_client
+    monkeypatch.setattr(mod, "UPLOAD_WORKERS", 4)
+
+    data = MultiDict()
+    data.add("files", (io.BytesIO(b"v1"), "p.xlsx"))
+    data.add("files", (io.BytesIO(b"notes"), "notes.txt"))
+    data.add("files", (io.BytesIO(b"v2"), "p.xlsx"))
+    data.add("files", (io.BytesIO(b"v1"), "copy.xlsx"))
+
+    r = client.post(
+        "/api/v1/ops/daily-import/inbox/upload",
+        headers={"X-API-Key": "testkey"},
+        data=data,
+        content_type="multipart/form-data",
+    )
+
+    assert r.status_code == 200
+    payload = r.get_json()
+    # имена и дедуп внутри пачки решаются в порядке файлов в запросе
+    assert [u["saved_name"] for u in payload["uploaded"]] == ["p.xlsx", "p (1).xlsx"]
+    assert [(x["original_name"], x["reason"]) for x in payload["rejected"]] == [
+        ("notes.txt", "INVALID_FILE"),
+        ("copy.xlsx", "DUPLICATE"),
+    ]
+    assert (dirs["inbox"] / "p.xlsx").read_bytes() == b"v1"
+    assert (dirs["inbox"] / "p (1).xlsx").read_bytes() == b"v2"
+    assert not list(dirs["inbox"].glob(".upload-*.tmp"))
+
+
 def test_upload_name_conflict_allocates_prices_1(ops_client):
     client, _mod, dirs = ops_client
 
@@ -213,11 +353,65 @@ def test_upload_name_conflict_allocates_prices_1(ops_client):
     assert (dirs["inbox"] / "prices.xlsx").read_bytes() == b"v1"
     assert (dirs["inbox"] / "prices (1).xlsx").read_bytes() == b"v2"
 
+
+def test_upload_name_conflict_within_one_batch(ops_client):
+    client, _mod, dirs = ops_client
+    (dirs["inbox"] / "prices.xlsx").write_bytes(b"v0")
+
+    r = client.post(
+        "/api/v1/ops/daily-import/inbox/upload",
+        headers={"X-API-Key": "testkey"},
+        data={"files": [
+            (io.BytesIO(b"v1"), "prices.xlsx"),
+            (io.BytesIO(b"v2"), "prices.xlsx"),
+        ]},
+        content_type="multipart/form-data",
+    )
+
+    assert r.status_code == 200
+    saved = [u["saved_name"] for u in r.get_json()["uploaded"]]
+    # снимок имён обновляется после каждого опубликованного файла пачки
+    assert saved == ["prices (1).xlsx", "prices (2).xlsx"]
+    assert (dirs["inbox"] / "prices.xlsx").read_bytes() == b"v0"
+    assert (dirs["inbox"] / "prices (1).xlsx").read_bytes() == b"v1"
+    assert (dirs["inbox"] / "prices (2).xlsx").read_bytes() == b"v2"
+
+
+def test_upload_never_overwrites_file_appearing_after_name_snapshot(ops_client, monkeypatch):
+    client, mod, dirs = ops_client
+
+    # файл, о котором БД не знает, появляется в INBOX уже после снимка имён
+    real_link = mod.os.link
+    raced = []
+
+    def _link(src, dst):
+        if not raced:
+            raced.append(dst)
+            Path(dst).write_bytes(b"foreign")
+        real_link(src, dst)
+
+    monkeypatch.setattr(mod.os, "link", _link)
+
+    r = client.post(
+        "/api/v1/ops/daily-import/inbox/upload",
+        headers={"X-API-Key": "testkey"},
+        data={"files": (io.BytesIO(b"mine"), "prices.xlsx")},
+        content_type="multipart/form-data",
+    )
+
+    assert r.status_code == 200
+    uploaded = r.get_json()["uploaded"]
+    assert [u["saved_name"] for u in uploaded] == ["prices (1).xlsx"]
+    assert (dirs["inbox"] / "prices.xlsx").read_bytes() == b"foreign"
+    assert (dirs["inbox"] / "prices (1).xlsx").read_bytes() == b"mine"
+    assert not list(dirs["inbox"].glob(".upload-*.tmp"))
+
+
 def test_upload_dedupe_same_content_rejected_by_sha(ops_client):
     client, _mod, dirs = ops_client
 
-    payload = b"same-content"
-    sha = hashlib.sha256(payload).hexdigest()
+    payload = _PAYLOAD_SAME
+    sha = _SHA_SAME
 
     r1 = client.post(
         "/api/v1/ops/daily-import/inbox/upload",
@@ -247,6 +441,76 @@ def test_upload_dedupe_same_content_rejected_by_sha(ops_client):
     assert not (dirs["inbox"] / "b.xlsx").exists()
 
 
+def test_upload_fsyncs_tmp_before_publishing(ops_client, monkeypatch):
+    client, mod, dirs = ops_client
+
+    calls = []
+    real_fsync, real_link = mod.os.fsync, mod.os.link
+
+    def _fsync(fd):
+        calls.append("fsync")
+        real_fsync(fd)
+
+    def _link(src, dst):
+        calls.append("link")
+        real_link(src, dst)
+
+    monkeypatch.setattr(mod.os, "fsync", _fsync)
+    monkeypatch.setattr(mod.os, "link", _link)
+
+    r = client.post(
+        "/api/v1/ops/daily-import/inbox/upload",
+        headers={"X-API-Key": "testkey"},
+        data={"files": (io.BytesIO(b"durable-bytes"), "durable.xlsx")},
+        content_type="multipart/form-data",
+    )
+
+    assert r.status_code == 200
+    assert calls == ["fsync", "link"]
+    assert (dirs["inbox"] / "durable.xlsx").read_bytes() == b"durable-bytes"
+
+
+def test_upload_failed_finalize_leaves_no_tmp_file(ops_client, monkeypatch):
+    client, mod, dirs = ops_client
+
+    def _boom(src, dst):
+        raise OSError("link failed")
+
+    monkeypatch.setattr(mod.os, "link", _boom)
+
+    r = client.post(
+        "/api/v1/ops/daily-import/inbox/upload",
+        headers={"X-API-Key": "testkey"},
+        data={"files": (io.BytesIO(b"will-not-land"), "lost.xlsx")},
+        content_type="multipart/form-data",
+    )
+
+    assert r.status_code == 500
+    assert not (dirs["inbox"] / "lost.xlsx").exists()
+    assert not list(dirs["inbox"].glob(".upload-*.tmp"))
+
+
+def test_upload_sha256_matches_ingest_file_hash(ops_client):
+    """
+    sha256 загрузки сверяется с ingest_envelope.file_sha256, который считает ETL
+    (scripts.idempotency) — алгоритмы обязаны совпадать.
+    """
+    from scripts.idempotency import compute_file_sha256
+
+    client, _mod, dirs = ops_client
+
+    r = client.post(
+        "/api/v1/ops/daily-import/inbox/upload",
+        headers={"X-API-Key": "testkey"},
+        data={"files": (io.BytesIO(b"contract-xlsx-bytes"), "contract.xlsx")},
+        content_type="multipart/form-data",
+    )
+
+    assert r.status_code == 200
+    uploaded = r.get_json()["uploaded"][0]
+    assert uploaded["sha256"] == compute_file_sha256(str(dirs["inbox"] / "contract.xlsx"))
+
+
 def test_upload_rejects_if_already_imported_by_sha256(ops_client):
     client, _mod, dirs = ops_client
 
@@ -287,6 +551,67 @@ def test_upload_accepts_files_array_field_name_files_brackets(ops_client):
     assert data and data["uploaded"] and data["uploaded"][0]["saved_name"] == "a.xlsx"
     assert (dirs["inbox"] / "a.xlsx").exists()
 
+
+def test_upload_mixed_field_names_grouped_by_first_seen_field(ops_client, monkeypatch):
+    client, mod, _dirs = ops_client
+    monkeypatch.setattr(mod, "MAX_FILES", 3)
+
+    def post(data):
+        return client.post(
+            "/api/v1/ops/daily-import/inbox/upload",
+            headers={"X-API-Key": "testkey"},
+            data=data,
+            content_type="multipart/form-data",
+        )
+
+    # порядок — по полям (в порядке первого появления), внутри поля — как в форме;
+    # посторонние поля игнорируются
+    r = post({
+        "files[]": (io.BytesIO(b"1"), "b.xlsx"),
+        "other": (io.BytesIO(b"?"), "ignored.xlsx"),
+        "files": [(io.BytesIO(b"2"), "a.xlsx"), (io.BytesIO(b"3"), "c.xlsx")],
+    })
+    assert r.status_code == 200
+    assert [u["saved_name"] for u in r.get_json()["uploaded"]] == ["b.xlsx", "a.xlsx", "c.xlsx"]
+
+    # лимит считается по обоим полям вместе
+    r = post({
+        "files[]": [(io.BytesIO(b"4"), "d.xlsx"), (io.BytesIO(b"5"), "e.xlsx")],
+        "files": [(io.BytesIO(b"6"), "f.xlsx"), (io.BytesIO(b"7"), "g.xlsx")],
+    })
+    assert r.status_code == 400
+    assert "Too many files" in r.get_json()["error"]
+
+
+def test_upload_interleaved_field_names_are_grouped_by_field(ops_client):
+    client, _mod, _dirs = ops_client
+
+    def part(field, filename, payload):
+        return (
+            f"--{_BOUNDARY}\r\n"
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode() + payload + b"\r\n"
+
+    # files a, files[] b, files c — чередование полей в самом теле
+    body = (
+        part("files", "a.xlsx", b"1")
+        + part("files[]", "b.xlsx", b"2")
+        + part("files", "c.xlsx", b"3")
+        + f"--{_BOUNDARY}--\r\n".encode()
+    )
+    r = client.post(
+        "/api/v1/ops/daily-import/inbox/upload",
+        headers={"X-API-Key": "testkey"},
+        data=body,
+        content_type=f"multipart/form-data; boundary={_BOUNDARY}",
+    )
+
+    assert r.status_code == 200
+    # MultiDict группирует значения по ключу: не a, b, c, а a, c, b
+    assert [u["saved_name"] for u in r.get_json()["uploaded"]] == ["a.xlsx", "c.xlsx", "b.xlsx"]
+
+
 def test_upload_rejects_non_xlsx_extension(ops_client):
     client, _mod, dirs = ops_client
 
@@ -311,48 +636,67 @@ def test_upload_rejects_non_xlsx_extension(ops_client):
     assert not (dirs["inbox"] / "notes.txt").exists()
 
 
-@pytest.mark.parametrize(
-    "bad_name",
-    [
-        "../evil.xlsx",
-        "a/b.xlsx",
-        r"a\b.xlsx",
-        "-arg.xlsx",
-        "...\x00.xlsx",
-    ],
+_BAD_NAMES = (
+    "../evil.xlsx",
+    "a/b.xlsx",
+    r"a\b.xlsx",
+    "-arg.xlsx",
+    "...\x00.xlsx",
 )
-def test_upload_rejects_dangerous_filenames(ops_client, bad_name):
+
+
+def test_upload_rejects_dangerous_filenames(ops_client):
+    # чистая валидация имени, файл не пишется — все случаи на одном клиенте
     client, _mod, dirs = ops_client
 
-    r = client.post(
-        "/api/v1/ops/daily-import/inbox/upload",
-        headers={"X-API-Key": "testkey"},
-        data={"files": (io.BytesIO(b"x"), bad_name)},
-        content_type="multipart/form-data",
-    )
+    for bad_name in _BAD_NAMES:
+        r = client.post(
+            "/api/v1/ops/daily-import/inbox/upload",
+            headers={"X-API-Key": "testkey"},
+            data={"files": (io.BytesIO(b"x"), bad_name)},
+            content_type="multipart/form-data",
+        )
 
-    assert r.status_code == 200
-    data = r.get_json()
-    assert data is not None
+        assert r.status_code == 200, bad_name
+        data = r.get_json()
+        assert data is not None, bad_name
 
-    assert data["uploaded"] == []
-    assert data["rejected"] and len(data["rejected"]) == 1
-    assert data["rejected"][0]["reason"] == "INVALID_FILE"
+        assert data["uploaded"] == [], bad_name
+        assert data["rejected"] and len(data["rejected"]) == 1, bad_name
+        assert data["rejected"][0]["reason"] == "INVALID_FILE", bad_name
+
+    assert not list(dirs["inbox"].iterdir())
+
+
+@pytest.mark.parametrize(
+    "name, ok",
+    [
+        ("prices.xlsx", True),
+        ("Прайс-лист 2025.XLSX", True),
+        ("ok-1.xlsx", True),
+        ("x..y.xlsx", False),
+        ("a\x00.xlsx", False),
+        ("..", False),
+        ("-", False),
+    ],
+)
+def test_validate_inbox_xlsx_basename(_ops_mod, name, ok):
+    if ok:
+        assert _ops_mod._validate_inbox_xlsx_basename(name) == name
+    else:
+        with pytest.raises(ValueError):
+            _ops_mod._validate_inbox_xlsx_basename(name)
 
 
 def test_upload_too_many_files_returns_400(ops_client):
     client, mod, _dirs = ops_client
 
     # MAX_FILES + 1
-    data = MultiDict()
-    for i in range(mod.MAX_FILES + 1):
-        data.add("files", (io.BytesIO(b"x"), f"f{i}.xlsx"))
-
     r = client.post(
         "/api/v1/ops/daily-import/inbox/upload",
         headers={"X-API-Key": "testkey"},
-        data=data,
-        content_type="multipart/form-data",
+        data=_multipart_files_body(mod.MAX_FILES + 1),
+        content_type=f"multipart/form-data; boundary={_BOUNDARY}",
     )
 
     assert r.status_code == 400
@@ -401,6 +745,56 @@ def test_upload_total_payload_too_large_returns_413(ops_client, monkeypatch):
     assert data and data.get("error") == "payload_too_large"
 
 
+def test_upload_declared_length_over_limit_never_reads_body(ops_client):
+    client, mod, dirs = ops_client
+
+    class _UntouchedStream(io.BytesIO):
+        def _fail(self, *_a, **_kw):
+            raise AssertionError("request body must not be read on 413 pre-check")
+
+        read = readinto = readline = _fail
+
+    # заявленная длина больше лимита, тело — поток, который нельзя читать
+    r = client.post(
+        "/api/v1/ops/daily-import/inbox/upload",
+        headers={"X-API-Key": "testkey"},
+        input_stream=_UntouchedStream(_multipart_files_body(1)),
+        content_type=f"multipart/form-data; boundary={_BOUNDARY}",
+        environ_overrides={"CONTENT_LENGTH": str(mod.MAX_UPLOAD_TOTAL_BYTES + 1)},
+    )
+
+    assert r.status_code == 413
+    assert r.get_json() == {"error": "payload_too_large"}
+    assert not list(dirs["inbox"].iterdir())
+
+
+def test_upload_body_over_max_content_length_returns_413(ops_client, monkeypatch):
+    """
+    Без Content-Length (chunked: сервер сам терминирует поток и ставит
+    wsgi.input_terminated) pre-check во view не срабатывает — тело обрывает
+    werkzeug по MAX_CONTENT_LENGTH при разборе, ответ тот же 413.
+    """
+    client, _mod, dirs = ops_client
+    monkeypatch.setitem(client.application.config, "MAX_CONTENT_LENGTH", 64)
+
+    environ = EnvironBuilder(
+        path="/api/v1/ops/daily-import/inbox/upload",
+        method="POST",
+        headers={"X-API-Key": "testkey"},
+        data={"files": (io.BytesIO(b"x" * 1024), "huge.xlsx")},
+        content_type="multipart/form-data",
+    ).get_environ()
+    del environ["CONTENT_LENGTH"]
+    environ["wsgi.input_terminated"] = True
+
+    # готовый Request: client.open() не пересобирает environ (и не вернёт CONTENT_LENGTH)
+    r = client.open(WerkzeugRequest(environ))
+
+    assert r.status_code == 413
+    assert r.get_json() == {"error": "payload_too_large"}
+    assert not list(dirs["inbox"].iterdir())
+
+
 def test_upload_total_too_large_returns_sha256(ops_client, monkeypatch):
     """
     Гарантированно попадаем в ветку:
@@ -424,7 +818,7 @@ def test_upload_total_too_large_returns_sha256(ops_client, monkeypatch):
 
     data = MultiDict()
     data.add("files", (io.BytesIO(b"a" * 10), "a.xlsx"))
-    data.add("files", (io.BytesIO(b"b" * 10), "b.xlsx"))
+    data.add("files", (io.BytesIO(_PAYLOAD_BX10), "b.xlsx"))
 
     r = client.post(
         "/api/v1/ops/daily-import/inbox/upload",
@@ -443,7 +837,7 @@ def test_upload_total_too_large_returns_sha256(ops_client, monkeypatch):
 
     assert payload["rejected"] and payload["rejected"][0]["reason"] == "TOTAL_TOO_LARGE"
     assert payload["rejected"][0]["original_name"] == "b.xlsx"
-    assert payload["rejected"][0]["sha256"] == hashlib.sha256(b"b" * 10).hexdigest()
+    assert payload["rejected"][0]["sha256"] == _SHA_BX10
     assert len(payload["rejected"]) == 1
     assert not (dirs["inbox"] / "b.xlsx").exists()
 
@@ -452,22 +846,25 @@ def test_upload_total_too_large_returns_sha256(ops_client, monkeypatch):
 # Download tests
 # ──────────────────────────────────────────────────────────────────────────────
 
-@pytest.mark.parametrize("kind", ["archive", "quarantine", "logs"])
-def test_download_happy_path(kind, ops_client):
+def test_download_happy_path(ops_client):
+    # все kind'ы на одном ops_client: разное содержимое заодно проверяет,
+    # что kind → каталог не перепутаны
     client, _mod, dirs = ops_client
 
-    base: Path = dirs[kind]
-    (base / "hello.txt").write_bytes(b"hello-world")
+    for kind in ("archive", "quarantine", "logs"):
+        base: Path = dirs[kind]
+        (base / "hello.txt").write_bytes(f"hello-{kind}".encode())
 
-    r = client.get(
-        f"/api/v1/ops/files/{kind}/hello.txt",
-        headers={"X-API-Key": "testkey"},
-    )
+    for kind in ("archive", "quarantine", "logs"):
+        r = client.get(
+            f"/api/v1/ops/files/{kind}/hello.txt",
+            headers={"X-API-Key": "testkey"},
+        )
 
-    assert r.status_code == 200
-    assert r.data == b"hello-world"
-    cd = r.headers.get("Content-Disposition", "")
-    assert "attachment" in cd.lower()
+        assert r.status_code == 200, kind
+        assert r.data == f"hello-{kind}".encode(), kind
+        cd = r.headers.get("Content-Disposition", "")
+        assert "attachment" in cd.lower(), kind
 
 
 def test_download_invalid_kind_returns_400(ops_client):
@@ -499,6 +896,42 @@ def test_download_path_traversal_blocked_403(ops_client):
     assert data and "Path traversal" in data.get("error", "")
 
 
+def test_download_sibling_dir_with_base_prefix_blocked_403(ops_client):
+    client, _mod, dirs = ops_client
+
+    # "archive_evil" начинается с того же префикса, что и "archive" —
+    # проверка должна идти по границе каталога, а не по голой строке
+    sibling = dirs["archive"].parent / (dirs["archive"].name + "_evil")
+    sibling.mkdir(parents=True, exist_ok=True)
+    (sibling / "secret.txt").write_bytes(b"top-secret")
+
+    r = client.get(
+        f"/api/v1/ops/files/archive/../{sibling.name}/secret.txt",
+        headers={"X-API-Key": "testkey"},
+    )
+
+    assert r.status_code == 403
+    assert r.get_json() == {"error": "Path traversal blocked"}
+
+
+def test_download_symlink_escaping_base_blocked_403(ops_client):
+    client, _mod, dirs = ops_client
+
+    secret = dirs["archive"].parent / "secret.txt"
+    secret.write_bytes(b"top-secret")
+    try:
+        (dirs["archive"] / "link.txt").symlink_to(secret)
+    except OSError:
+        pytest.skip("symlinks are not supported here")
+
+    r = client.get(
+        "/api/v1/ops/files/archive/link.txt",
+        headers={"X-API-Key": "testkey"},
+    )
+
+    assert r.status_code == 403
+
+
 def test_download_not_found_returns_404(ops_client):
     client, _mod, _dirs = ops_client
 
@@ -511,6 +944,118 @@ def test_download_not_found_returns_404(ops_client):
     assert data and data.get("error") == "File not found"
 
 
+def test_download_uses_wsgi_file_wrapper(ops_client):
+    """
+    Отдача файла идёт через wsgi.file_wrapper сервера (gunicorn → sendfile),
+    с Content-Length и Last-Modified, без чтения файла в Python.
+    """
+    client, _mod, dirs = ops_client
+
+    body = b"a" * 4096
+    (dirs["archive"] / "big.xlsx").write_bytes(body)
+    wrapped = []
+
+    class _FileWrapper:
+        def __init__(self, f, block_size=8192):
+            wrapped.append(f)
+            self._f = f
+            self._block_size = block_size
+
+        def __iter__(self):
+            return iter(lambda: self._f.read(self._block_size), b"")
+
+        def close(self):
+            self._f.close()
+
+    r = client.get(
+        "/api/v1/ops/files/archive/big.xlsx",
+        headers={"X-API-Key": "testkey"},
+        environ_overrides={"wsgi.file_wrapper": _FileWrapper},
+    )
+
+    assert r.status_code == 200
+    assert wrapped, "send_file должен отдавать файл через wsgi.file_wrapper"
+    assert r.headers["Content-Length"] == str(len(body))
+    assert "Last-Modified" in r.headers
+    assert r.data == body
+
+
+def test_download_supports_range_requests(ops_client):
+    client, _mod, dirs = ops_client
+
+    (dirs["archive"] / "prices.xlsx").write_bytes(b"0123456789")
+
+    r = client.get(
+        "/api/v1/ops/files/archive/prices.xlsx",
+        headers={"X-API-Key": "testkey", "Range": "bytes=2-5"},
+    )
+
+    assert r.status_code == 206
+    assert r.data == b"2345"
+    assert r.headers["Content-Range"] == "bytes 2-5/10"
+    assert r.headers["Accept-Ranges"] == "bytes"
+
+
+@pytest.mark.parametrize(
+    "kind, expected",
+    [
+        ("archive", {"private", "max-age=60"}),
+        ("quarantine", {"private", "max-age=60"}),
+        ("logs", {"private", "no-cache"}),
+    ],
+)
+def test_download_cache_control_by_kind(ops_client, kind, expected):
+    client, _mod, dirs = ops_client
+
+    (dirs[kind] / "f.json").write_bytes(b"{}")
+    r = client.get(f"/api/v1/ops/files/{kind}/f.json", headers={"X-API-Key": "testkey"})
+
+    assert r.status_code == 200
+    assert {p.strip() for p in r.headers["Cache-Control"].split(",")} == expected
+    assert "X-Accel-Buffering" not in r.headers
+
+
+def test_download_large_file_disables_proxy_buffering(ops_client, monkeypatch):
+    client, mod, dirs = ops_client
+    monkeypatch.setattr(mod, "DOWNLOAD_STREAM_HINT_BYTES", 8)
+
+    (dirs["archive"] / "big.xlsx").write_bytes(b"x" * 16)
+    r = client.get("/api/v1/ops/files/archive/big.xlsx", headers={"X-API-Key": "testkey"})
+
+    assert r.status_code == 200
+    assert r.headers["X-Accel-Buffering"] == "no"
+
+
+def test_download_directory_returns_404(ops_client):
+    client, _mod, dirs = ops_client
+
+    (dirs["archive"] / "2025-01-01").mkdir()
+
+    r = client.get(
+        "/api/v1/ops/files/archive/2025-01-01",
+        headers={"X-API-Key": "testkey"},
+    )
+    assert r.status_code == 404
+
+
+def test_download_is_conditional_on_etag(ops_client):
+    client, _mod, dirs = ops_client
+
+    (dirs["logs"] / "run.json").write_bytes(b'{"status": "OK"}')
+
+    r1 = client.get("/api/v1/ops/files/logs/run.json", headers={"X-API-Key": "testkey"})
+    assert r1.status_code == 200
+    etag = r1.headers.get("ETag")
+    assert etag
+
+    r2 = client.get(
+        "/api/v1/ops/files/logs/run.json",
+        headers={"X-API-Key": "testkey", "If-None-Match": etag},
+    )
+    assert r2.status_code == 304
+    assert r2.data == b""
+
+
 def test_ops_endpoints_require_api_key(ops_client):
     client, _mod, _dirs = ops_client
 
@@ -1,10 +1,12 @@
 from __future__ import annotations
 
 import os
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
-from scripts.ops_housekeeping import IGNORE_NAMES, select_candidates
+import pytest
+
+from scripts.ops_housekeeping import IGNORE_NAMES, _apply_delete, select_candidates
 
 
 def _set_mtime(path: Path, *, dt_utc: datetime) -> None:
@@ -35,16 +37,85 @@ def test_select_candidates_filters_by_age(tmp_path: Path) -> None:
     assert got_paths == ["old.txt"]
 
 
+def test_select_candidates_cutoff_boundary_is_exclusive(tmp_path: Path) -> None:
+    base = tmp_path / "archive"
+    base.mkdir()
+
+    now = datetime(2026, 2, 8, 12, 30, 15, 250000, tzinfo=timezone.utc)
+    cutoff = now - timedelta(days=10)
+
+    at_cutoff = base / "at_cutoff.txt"
+    just_older = base / "just_older.txt"
+    at_cutoff.write_text("a", encoding="utf-8")
+    just_older.write_text("b", encoding="utf-8")
+
+    cutoff_ns = (cutoff - datetime(1970, 1, 1, tzinfo=timezone.utc)) // timedelta(microseconds=1) * 1000
+    os.utime(at_cutoff, ns=(cutoff_ns, cutoff_ns))
+    os.utime(just_older, ns=(cutoff_ns - 1000, cutoff_ns - 1000))
+
+    got = select_candidates(base, older_than_days=10, now=now)
+
+    assert [c.path.name for c in got] == ["just_older.txt"]
+    assert got[0].mtime == cutoff - timedelta(microseconds=1)
+
+
 def test_select_candidates_ignores_gitkeep(tmp_path: Path) -> None:
     base = tmp_path / "inbox"
     base.mkdir()
 
     now = datetime(2026, 2, 8, 0, 0, 0, tzinfo=timezone.utc)
 
-    gitkeep_name = next(iter(IGNORE_NAMES))
-    gitkeep = base / gitkeep_name
-    gitkeep.write_text("", encoding="utf-8")
-    _set_mtime(gitkeep, dt_utc=datetime(2020, 1, 1, 0, 0, 0, tzinfo=timezone.utc))
+    assert ".gitkeep" in IGNORE_NAMES
+    for name in sorted(IGNORE_NAMES):
+        placeholder = base / name
+        placeholder.write_text("", encoding="utf-8")
+        _set_mtime(placeholder, dt_utc=datetime(2020, 1, 1, 0, 0, 0, tzinfo=timezone.utc))
 
     got = select_candidates(base, older_than_days=1, now=now)
     assert got == []
+
+
+def test_select_candidates_recurses_and_skips_dirs_and_symlinks(tmp_path: Path) -> None:
+    base = tmp_path / "logs"
+    nested = base / "2026" / "01"
+    nested.mkdir(parents=True)
+
+    now = datetime(2026, 2, 8, 0, 0, 0, tzinfo=timezone.utc)
+    old = datetime(2026, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
+
+    deep = nested / "run.json"
+    deep.write_text("{}", encoding="utf-8")
+    _set_mtime(deep, dt_utc=old)
+    _set_mtime(nested, dt_utc=old)
+
+    outside = tmp_path / "outside.txt"
+    outside.write_text("keep me", encoding="utf-8")
+    _set_mtime(outside, dt_utc=old)
+    try:
+        (base / "link.txt").symlink_to(outside)
+    except OSError:
+        pytest.skip("symlinks are not available on this platform")
+
+    got = select_candidates(base, older_than_days=10, now=now)
+
+    assert [c.path for c in got] == [deep]
+    assert got[0].size_bytes == 2
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_apply_delete_removes_all_candidates(tmp_path: Path, workers: int) -> None:
+    base = tmp_path / "archive"
+    base.mkdir()
+
+    now = datetime(2026, 2, 8, 0, 0, 0, tzinfo=timezone.utc)
+    for i in range(10):
+        f = base / f"f{i}.xlsx"
+        f.write_bytes(b"x")
+        _set_mtime(f, dt_utc=datetime(2025, 1, 1, 0, 0, 0, tzinfo=timezone.utc))
+
+    plans = [("archive", select_candidates(base, older_than_days=30, now=now))]
+    # файл, исчезнувший между планом и удалением, — не ошибка
+    plans[0][1][0].path.unlink()
+
+    assert _apply_delete(plans, workers=workers) == 10
+    assert list(base.iterdir()) == []
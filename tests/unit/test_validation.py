@@ -1,6 +1,7 @@
 # tests/unit/test_validation.py
 from flask import Flask
 from pydantic import BaseModel, Field
+from werkzeug.datastructures import MultiDict
 
 from api.validation import validate_query_params
 
@@ -17,8 +18,8 @@ def test_validate_query_params_ok():
     validate_query_params должен вернуть модель и error=None,
     если query-параметры валидны.
     """
-    with app.test_request_context("/dummy?x=10&y=hello"):
-        params, error = validate_query_params(DummyParams)
+    # явные args: request context не нужен
+    params, error = validate_query_params(DummyParams, MultiDict({"x": "10", "y": "hello"}))
 
     assert error is None
     assert isinstance(params, DummyParams)
@@ -31,9 +32,10 @@ def test_validate_query_params_error():
     При невалидных параметрах validate_query_params должен вернуть
     (None, (Response, 400)) с JSON в формате validation_error.
     """
-    # x обязателен и должен быть int >= 0, поэтому "foo" сломает валидацию
-    with app.test_request_context("/dummy?x=foo"):
-        params, error = validate_query_params(DummyParams)
+    # x обязателен и должен быть int >= 0, поэтому "foo" сломает валидацию;
+    # jsonify нужен только app context, не request context
+    with app.app_context():
+        params, error = validate_query_params(DummyParams, MultiDict({"x": "foo"}))
 
     assert params is None
     assert error is not None
@@ -50,3 +52,23 @@ def test_validate_query_params_error():
     assert "loc" in first
     assert "msg" in first
     assert "type" in first
+
+
+def test_validate_query_params_defaults_to_request_args():
+    """
+    Без явных args берутся request.args текущего запроса
+    (в т.ч. для повторяющихся ключей — первое значение), результат
+    совпадает с DummyParams.model_validate.
+    """
+    with app.test_request_context("/dummy?x=3&x=7&y=a&extra=1"):
+        params, error = validate_query_params(DummyParams)
+
+    assert error is None
+    assert params == DummyParams.model_validate({"x": "3", "y": "a", "extra": "1"})
+
+
+def test_validate_query_params_accepts_plain_mapping():
+    params, error = validate_query_params(DummyParams, {"x": "5"})
+
+    assert error is None
+    assert params == DummyParams(x=5)